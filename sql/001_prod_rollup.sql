@@ -0,0 +1,23 @@
+-- Pre-aggregated readings for /api/history, maintained by the dataprocessor
+-- (see src/rollups.py). One row per bucket size, bucket and team.
+-- bucket_start is UTC, like prod.time.
+-- Fill from existing data: python src/rollups.py backfill
+
+CREATE TABLE IF NOT EXISTS prod_rollup (
+    bucket_seconds INT UNSIGNED NOT NULL,
+    bucket_start DATETIME NOT NULL,
+    team VARCHAR(32) NOT NULL,
+    temperature_sum DOUBLE NOT NULL DEFAULT 0,
+    temperature_count INT UNSIGNED NOT NULL DEFAULT 0,
+    temperature_min DOUBLE NULL,
+    temperature_max DOUBLE NULL,
+    humidity_sum DOUBLE NOT NULL DEFAULT 0,
+    humidity_count INT UNSIGNED NOT NULL DEFAULT 0,
+    humidity_min DOUBLE NULL,
+    humidity_max DOUBLE NULL,
+    lightness_sum DOUBLE NOT NULL DEFAULT 0,
+    lightness_count INT UNSIGNED NOT NULL DEFAULT 0,
+    lightness_min DOUBLE NULL,
+    lightness_max DOUBLE NULL,
+    PRIMARY KEY (bucket_seconds, bucket_start, team)
+);
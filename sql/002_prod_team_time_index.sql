@@ -0,0 +1,11 @@
+-- /api/history filters prod by team and time range (team IN (...) AND
+-- time >= ...), this index serves it for one team or all of them.
+--
+-- prod is not partitioned by time. MariaDB needs the partitioning column in
+-- every unique key, so it would mean changing the primary key of prod,
+-- which is not created by these migrations. Raw rows are read for at most
+-- HISTORY_RAW_MAX_SPAN (1 hour) and this index already limits such a query
+-- to the rows of that range; longer ranges read prod_rollup. Partition
+-- pruning would save nothing more.
+
+CREATE INDEX IF NOT EXISTS prod_team_time ON prod (team, time);
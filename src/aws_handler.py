@@ -1,18 +1,29 @@
-from requests import get, post, HTTPError
+from requests import RequestException, Session
+from requests.adapters import HTTPAdapter
 from json import dumps, JSONDecodeError
 import config as conf
-import json
 import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone, timedelta
 from logger import log
+from retry_journal import RetryJournal
+from retry_scheduler import OK, RETRY, FATAL, CircuitBreaker, RetryScheduler
+
+_STOP = object()  # sentinel for uploader threads
 
 
 def send_to_aws(message: dict):
     """
+    Queue measurements (and alerts) of one reading for upload, returns
+    without waiting for AWS.
+
     {'team_name': 'white', 'timestamp': '2020-03-24T15:26:05.336974', 'temperature': 25.72, 'humidity': 64.5, 'illumination': 1043}
     """
     for sense in ["temperature", "humidity", "illumination"]:
-        if sense not in message:  # skip if there is missing sensor
+        if message.get(sense) is None:  # skip if there is missing sensor
             continue
         data = {
             "sensor": conf.SENS_UUID[sense],
@@ -20,11 +31,10 @@ def send_to_aws(message: dict):
             "timestamp": timestamp_refination(message["timestamp"]),
         }
 
-        measurement_to_aws(data)
+        UPLOADER.submit("M", data)
         if is_alerting(data):  # podminka pro poslani alertu
-            alert_to_aws(data)
-
-    retry_failed_tasks()
+            UPLOADER.submit("A", data)
+    # failed tasks are retried by RETRY_SCHEDULER in background
 
 
 def timestamp_refination(inp: str) -> str:
@@ -37,35 +47,51 @@ def timestamp_refination(inp: str) -> str:
     return prague_winter.isoformat(timespec="milliseconds")
 
 
-def _post_(ep, body):
+def _make_session(pool_size=conf.AWS_MAX_CONCURRENCY) -> Session:
+    """Keep-alive session with one pooled connection per concurrent request."""
+    session = Session()
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(conf.HEADERS)
+    return session
+
+
+SESSION = _make_session()
+
+
+def _post_(ep, body, session=None) -> str:
+    """Post body, return OK / RETRY / FATAL (see retry_scheduler)."""
     try:
-        response = post(ep, dumps(body), headers=conf.HEADERS)
+        response = (session or SESSION).post(ep, dumps(body), timeout=conf.AWS_TIMEOUT)
 
         if response.status_code == 200:
             try:
-                return response.json()
+                return OK if response.json() else RETRY
             except JSONDecodeError:
                 log(
                     f"Response is not of JSON format: {response}",
                     level="ERROR",
                     category="AWS",
                 )
-                return {}
+                return RETRY
         elif response.status_code == 504:
             log("Aws is not awake yet", level="WARNING")
-            return {}
+            return RETRY
         else:
             log(f"Status code: {response.status_code}", level="ERROR", category="AWS")
-            return {}
+            if response.status_code >= 500 or response.status_code == 429:
+                return RETRY
+            return FATAL
 
-    except HTTPError as http_err:
-        log(f"HTTP error occurred: {http_err}", level="ERROR", category="AWS")
-        return {}
+    except RequestException as err:  # HTTPError, Timeout, ConnectionError...
+        log(f"HTTP error occurred: {err}", level="ERROR", category="AWS")
+        return RETRY
 
 
 def _get_(ep):
     try:
-        response = get(ep, headers=conf.HEADERS)
+        response = SESSION.get(ep, timeout=conf.AWS_TIMEOUT)
 
         if response.status_code == 200:
             try:
@@ -81,67 +107,221 @@ def _get_(ep):
             log(f"Status code: {response.status_code}", level="ERROR", category="AWS")
             return {}
 
-    except HTTPError as http_err:
-        log(f"HTTP error occurred: {http_err}", level="ERROR", category="AWS")
+    except RequestException as err:
+        log(f"HTTP error occurred: {err}", level="ERROR", category="AWS")
         return {}
 
 
-# === QUEUE HANDLING ===
-def _load_failed_queue():
-    if os.path.exists(conf.FAILED_QUEUE_FILE):
-        with open(conf.FAILED_QUEUE_FILE, "r") as f:
-            try:
-                content = f.read().strip()
-                return json.loads(content) if content else []
-            except json.JSONDecodeError:
-                log("Error parsing failed_queue.json", level="ERROR", category="AWS")
-                return []
-    return []
-
-
-def _save_failed_queue(queue):
-    with open(conf.FAILED_QUEUE_FILE, "w") as f:
-        json.dump(queue, f, indent=4)
-
+# === UPLOADER ===
+class AwsUploader:
+    """
+    Outbound queue with a dispatcher thread and a pool of `workers` threads
+    posting through one keep-alive session.
+
+    The dispatcher coalesces queued tasks into batches (up to `batch_size`
+    tasks, waiting at most `max_delay` seconds for more) and hands them to
+    upload_many(). With `batch_upload` measurements of the same sensor go
+    in one request as a JSON list (only if the API accepts it), otherwise
+    every task is its own request and they are sent concurrently.
+
+    submit() never waits for the network. Tasks that fail, or that do not
+    fit into the queue, go to the failed queue. While the endpoint's circuit
+    breaker is open, tasks go to the failed queue without being sent.
+    Endpoints, session and breakers (per type, default BREAKERS) can be
+    replaced, e.g. to run against a local stub.
+    """
 
-def _add_to_failed_queue(type, data):
-    queue = _load_failed_queue()
-    queue.append((type, data))
-    _save_failed_queue(queue)
+    def __init__(
+        self,
+        endpoints=None,
+        session=None,
+        breakers=None,
+        workers=conf.AWS_MAX_CONCURRENCY,
+        queue_max=conf.AWS_QUEUE_MAX,
+        batch_size=conf.AWS_BATCH_SIZE,
+        max_delay=conf.AWS_BATCH_MAX_DELAY,
+        batch_upload=conf.AWS_BATCH_UPLOAD,
+    ):
+        self.endpoints = endpoints or {"M": conf.EP_MEASUREMENTS, "A": conf.EP_ALERTS}
+        self.session = session or SESSION
+        self.breakers = breakers or BREAKERS
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.batch_upload = batch_upload
+        self._queue = queue.Queue(maxsize=queue_max)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="aws")
+        self._thread = None
+        self._lock = threading.Lock()
+        self.sent = 0
+        self.failed = 0
+        self.requests = 0
+
+    def start(self):
+        with self._lock:
+            if self._thread:
+                return
+            self._thread = threading.Thread(
+                target=self._dispatch, name="aws-dispatch", daemon=True
+            )
+            self._thread.start()
+
+    def close(self):
+        """Upload everything still queued, then stop the dispatcher and workers."""
+        if self._thread:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+        self._pool.shutdown()
+
+    def submit(self, type, data) -> bool:
+        if not self._thread:
+            self.start()
+        try:
+            self._queue.put_nowait((type, data))
+            return True
+        except queue.Full:
+            log(
+                "Upload queue is full, task goes to failed queue.",
+                level="WARNING",
+                category="AWS",
+            )
+            _add_to_failed_queue(type, data)
+            return False
+
+    def upload(self, type, data) -> str:
+        """Post one task right away (no failed queue handling), return outcome."""
+        return self._post_chunk(type, [data])
+
+    def upload_many(
+        self, tasks: list[tuple[str, dict]], pace=None, breaker=None
+    ) -> tuple[list[str], int]:
+        """
+        Post tasks concurrently, batched per sensor if enabled. `pace()` is
+        called before every request (rate limit), `breaker` replaces the
+        breaker of the task type, see RetryScheduler.
+        Returns (outcome of every task, number of requests made).
+        """
+        chunks = {}  # (type, sensor or task index) -> [task indexes]
+        for i, (type, data) in enumerate(tasks):
+            key = (type, data.get("sensor")) if self._batchable(type) else (type, i)
+            chunks.setdefault(key, []).append(i)
+
+        jobs = []
+        for (type, _), indexes in chunks.items():
+            for start in range(0, len(indexes), self.batch_size):
+                part = indexes[start : start + self.batch_size]
+                datas = [tasks[i][1] for i in part]
+                jobs.append(
+                    (
+                        part,
+                        self._pool.submit(
+                            self._post_chunk,
+                            type,
+                            datas,
+                            pace,
+                            breaker or self.breakers[type],
+                        ),
+                    )
+                )
 
+        outcomes = [RETRY] * len(tasks)
+        for part, future in jobs:
+            try:
+                outcome = future.result()
+            except Exception as e:  # must not kill the dispatcher thread
+                log(f"Upload failed: {e!r}", level="ERROR", category="AWS")
+                outcome = RETRY
+            for i in part:
+                outcomes[i] = outcome
+        with self._lock:
+            self.requests += len(jobs)
+        return outcomes, len(jobs)
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def _batchable(self, type) -> bool:
+        return self.batch_upload and type == "M"
+
+    def _post_chunk(self, type, datas: list[dict], pace=None, breaker=None) -> str:
+        if pace is not None and not pace():
+            return RETRY
+        breaker = breaker or self.breakers[type]
+        if not breaker.allow():
+            return RETRY
+        try:
+            if self._batchable(type):
+                body = [PAYLOADS[type](data) for data in datas]
+            else:
+                body = PAYLOADS[type](datas[0])
+            outcome = _post_(self.endpoints[type], body, self.session)
+        except Exception as e:
+            # recorded anyway, a half-open breaker waits for its probe
+            log(f"Upload of {type} failed: {e!r}", level="ERROR", category="AWS")
+            outcome = RETRY
+        breaker.record(outcome)
+        return outcome
+
+    def _dispatch(self):
+        stop = False
+        while not stop:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+
+            outcomes, _ = self.upload_many(batch)
+            for (type, data), outcome in zip(batch, outcomes):
+                if outcome == RETRY:
+                    _add_to_failed_queue(type, data)
+                elif outcome == FATAL:
+                    log(f"AWS rejected task: {data}", level="ERROR", category="AWS")
+            with self._lock:
+                self.sent += outcomes.count(OK)
+                self.failed += len(outcomes) - outcomes.count(OK)
 
-def retry_failed_tasks():
-    queue = _load_failed_queue()
-    if not queue:
-        return
 
-    log(f"Retrying {len(queue)} failed tasks...", category="AWS")
-    new_queue = []
+# === QUEUE HANDLING ===
+# one failed queue (journal) and one circuit breaker per endpoint,
+# so an outage of one endpoint does not hold back the other
+BREAKERS = {type: CircuitBreaker(type) for type in ("M", "A")}
+FAILED_JOURNALS = {
+    type: RetryJournal(
+        os.path.join(conf.FAILED_QUEUE_DIR, type),
+        segment_bytes=conf.FAILED_QUEUE_SEGMENT_BYTES,
+        fsync=conf.FAILED_QUEUE_FSYNC,
+    )
+    for type in ("M", "A")
+}
 
-    for type, item in queue:
-        if type == "M":
-            if not measurement_to_aws(item):  # it tryes to post and return result
-                new_queue.append((type, item))
-        elif type == "A":
-            if not alert_to_aws(item):
-                new_queue.append((type, item))
 
-    _save_failed_queue(new_queue)
+def _add_to_failed_queue(type, data):
+    FAILED_JOURNALS[type].append([type, data, time.time()])
 
 
 # Create Measurement
-def measurement_to_aws(data: dict):
-    # log(f"Uploading measurement for sensorUUID {data['sensor']}", category="AWS")
-
-    payload = {
+def _measurement_payload(data: dict) -> dict:
+    return {
         "createdOn": data["timestamp"],  # format "2022-10-05T13:00:00.000+01:00"
         "sensorUUID": data["sensor"],
         "temperature": data["value"],
         "status": "OK",  # "test" for testing, "OK" for prod
     }
 
-    responce = _post_(conf.EP_MEASUREMENTS, payload)
-    if bool(responce):
+
+def measurement_to_aws(data: dict):
+    # log(f"Uploading measurement for sensorUUID {data['sensor']}", category="AWS")
+    if UPLOADER.upload("M", data) == OK:
         # log("Measurement upload to AWS sucessful", category="AWS")
         return True
     else:
@@ -150,10 +330,8 @@ def measurement_to_aws(data: dict):
 
 
 # Create Alert
-def alert_to_aws(data: dict):
-    # log(f"Uploading alert for sensorUUID {data['sensor']}", category="AWS")
-
-    payload = {  # no status
+def _alert_payload(data: dict) -> dict:
+    return {  # no status
         "createdOn": data["timestamp"],  # format "2022-10-05T13:00:00.000+01:00"
         "sensorUUID": data["sensor"],
         "temperature": data["value"],
@@ -161,8 +339,10 @@ def alert_to_aws(data: dict):
         "lowTemperature": conf.SENS_MIN_MAX[data["sensor"]][0],
     }
 
-    responce = _post_(conf.EP_ALERTS, payload)
-    if bool(responce):
+
+def alert_to_aws(data: dict):
+    # log(f"Uploading alert for sensorUUID {data['sensor']}", category="AWS")
+    if UPLOADER.upload("A", data) == OK:
         # log("Alert upload to AWS sucessful", category="AWS")
         return True
     else:
@@ -170,6 +350,14 @@ def alert_to_aws(data: dict):
         return False
 
 
+PAYLOADS = {"M": _measurement_payload, "A": _alert_payload}
+UPLOADER = AwsUploader()
+RETRY_SCHEDULER = RetryScheduler(
+    {type: (FAILED_JOURNALS[type], BREAKERS[type]) for type in ("M", "A")},
+    upload_many=UPLOADER.upload_many,
+)
+
+
 # Read Measurements
 def read_measurements():  # if someone needs it
     measurements = _get_(conf.EP_MEASUREMENTS)
@@ -0,0 +1,98 @@
+"""
+Local stub of the Aimtech REST API, for testing uploads without AWS.
+
+Run: python src/benchmarks/aws_stub.py [number_of_readings]
+(from the directory with `credentials/`, like the dataprocessor)
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class StubServer:
+    """
+    HTTP server on 127.0.0.1 answering every POST with `status`
+    after `delay` seconds. Counts requests, items and bytes received.
+    """
+
+    def __init__(self, status=200, delay=0.0):
+        self.status = status
+        self.delay = delay
+        self.requests = 0
+        self.items = 0
+        self.bytes = 0
+        self.connections = set()
+        self._lock = threading.Lock()
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                payload = json.loads(body)
+                with stub._lock:
+                    stub.requests += 1
+                    stub.items += len(payload) if isinstance(payload, list) else 1
+                    stub.bytes += len(body) + sum(
+                        len(k) + len(v) + 4 for k, v in self.headers.items()
+                    )
+                    stub.connections.add(self.client_address)
+                time.sleep(stub.delay)
+                answer = b'{"ok": true}'
+                self.send_response(stub.status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(answer)))
+                self.end_headers()
+                self.wfile.write(answer)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+if __name__ == "__main__":
+    import aws_handler as aws
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+    with StubServer(delay=0.02) as stub:
+        uploader = aws.AwsUploader(
+            endpoints={"M": stub.url + "/measurements", "A": stub.url + "/alerts"}
+        )
+        data = {
+            "sensor": aws.conf.SENS_UUID["temperature"],
+            "value": 21.5,
+            "timestamp": "2025-11-14T10:40:07.336+01:00",
+        }
+
+        start = time.perf_counter()
+        for _ in range(n):
+            uploader.submit("M", data)
+        submit_time = time.perf_counter() - start
+        uploader.close()
+        total_time = time.perf_counter() - start
+
+        print(f"submit:      {1e6 * submit_time / n:.1f} us per task")
+        print(f"upload:      {n / total_time:.0f} tasks/s")
+        print(f"requests:    {stub.requests} ({uploader.failed} failed)")
+        print(f"connections: {len(stub.connections)}")
@@ -0,0 +1,75 @@
+"""
+Benchmark of draining a failed-measurements backlog against a local stub.
+Reports requests and bytes per drained item for one-by-one, pipelined
+(concurrent) and batched uploads.
+
+Run: python src/benchmarks/bench_aws_drain.py [backlog_size]
+(from the directory with `credentials/`, like the dataprocessor)
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aws_handler as aws  # noqa: E402
+from aws_stub import StubServer  # noqa: E402
+from retry_journal import RetryJournal  # noqa: E402
+from retry_scheduler import CircuitBreaker, RetryScheduler  # noqa: E402
+
+MODES = {  # name: (workers, batch_upload)
+    "one-by-one": (1, False),
+    "pipelined": (aws.conf.AWS_MAX_CONCURRENCY, False),
+    "batched": (aws.conf.AWS_MAX_CONCURRENCY, True),
+}
+
+
+def drain(n, workers, batch_upload, delay=0.01) -> dict:
+    with StubServer(delay=delay) as stub, tempfile.TemporaryDirectory() as tmp:
+        journal = RetryJournal(tmp)
+        for i in range(n):
+            sense = ("temperature", "humidity", "illumination")[i % 3]
+            data = {
+                "sensor": aws.conf.SENS_UUID[sense],
+                "value": 20.0 + i % 7,
+                "timestamp": "2025-11-14T10:40:07.336+01:00",
+            }
+            journal.append(["M", data, time.time()])
+
+        uploader = aws.AwsUploader(
+            endpoints={"M": stub.url + "/measurements", "A": stub.url + "/alerts"},
+            workers=workers,
+            batch_upload=batch_upload,
+        )
+        scheduler = RetryScheduler(
+            {"M": (journal, CircuitBreaker("M"))},
+            upload_many=uploader.upload_many,
+            rate=float("inf"),
+        )
+
+        start = time.perf_counter()
+        while not journal.empty():
+            scheduler.drain("M")
+        elapsed = time.perf_counter() - start
+        uploader.close()
+
+        return {
+            "items/s": n / elapsed,
+            "requests/item": stub.requests / n,
+            "bytes/item": stub.bytes / n,
+        }
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+
+    print(f"{'mode':<12}{'items/s':>10}{'requests/item':>16}{'bytes/item':>12}")
+    for name, (workers, batch_upload) in MODES.items():
+        r = drain(n, workers, batch_upload)
+        print(
+            f"{name:<12}{r['items/s']:>10.0f}"
+            f"{r['requests/item']:>16.3f}{r['bytes/item']:>12.1f}"
+        )
@@ -0,0 +1,112 @@
+"""
+Face matcher benchmark on faceid_files/dataset: the SVM of train_model.py
+vs the gallery matcher (nearest sample / nearest centroid, one matrix
+product per frame, threshold calibrated on the training faces).
+
+Stratified k-fold: fit on k-1 folds, test on the remaining one. A test face
+is correct when it gets its own name, faces of "unknown" also when they are
+rejected; a false accept is a face given the name of another user. Latency
+is per frame of --faces faces: per-face predict_proba (as Recognizer did)
+vs one call for the whole frame.
+
+Embeddings come from extract_embeddings.embeddings(), cached in
+objects/embeddings.npz, the models are needed only for new images.
+
+Run from the repository root: python src/benchmarks/bench_face_matcher.py
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from sklearn.model_selection import StratifiedKFold
+from sklearn.preprocessing import LabelEncoder
+from sklearn.svm import SVC
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import faceid.face_config as FID_CFG  # noqa: E402
+from faceid.extract_embeddings import embeddings  # noqa: E402
+from faceid.gallery import Gallery  # noqa: E402
+
+
+def per_frame_ms(predict, frames, repeat) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for frame in frames:
+            predict(frame)
+    return 1000 * (time.perf_counter() - start) / (repeat * len(frames))
+
+
+def evaluate(truth, predicted) -> tuple[int, int]:
+    """(correct, false accepts)"""
+    correct = np.sum(truth == predicted)
+    accepted = predicted != FID_CFG.FID_UNKNOWN
+    return int(correct), int(np.sum(accepted & (truth != predicted)))
+
+
+def main(args):
+    names, vectors = embeddings()
+    names = np.array(names)
+    print(f"{len(names)} faces of {len(set(names))} names, {args.folds} folds\n")
+
+    rows = {m: np.zeros(4) for m in ("svm", "nn", "centroid")}
+    thresholds = {"nn": [], "centroid": []}  # of folds that could be calibrated
+    folds = StratifiedKFold(args.folds, shuffle=True, random_state=0)
+    for train, test in folds.split(vectors, names):
+        frames = [
+            vectors[test][i : i + args.faces] for i in range(0, len(test), args.faces)
+        ]
+
+        le = LabelEncoder()
+        start = time.perf_counter()
+        svm = SVC(C=1.0, kernel="linear", probability=True)
+        svm.fit(vectors[train], le.fit_transform(names[train]))
+        fit = time.perf_counter() - start
+        predicted = le.classes_[svm.predict_proba(vectors[test]).argmax(axis=1)]
+        looped = per_frame_ms(
+            lambda frame: [svm.predict_proba(vec[None]) for vec in frame],
+            frames,
+            args.repeat,
+        )
+        rows["svm"] += (*evaluate(names[test], predicted), fit, looped)
+
+        for method in ("nn", "centroid"):
+            start = time.perf_counter()
+            gallery = Gallery(path=None)
+            for name in sorted(set(names[train])):
+                gallery.add(name, vectors[train][names[train] == name])
+            gallery.calibrate(args.far, method)
+            fit = time.perf_counter() - start
+            predicted = np.array(
+                [name for name, _ in gallery.match(vectors[test], method)]
+            )
+            batched = per_frame_ms(
+                lambda frame: gallery.match(frame, method), frames, args.repeat
+            )
+            rows[method] += (*evaluate(names[test], predicted), fit, batched)
+            if gallery.threshold is not None:  # None: no impostors to calibrate on
+                thresholds[method].append(gallery.threshold)
+
+    print(
+        f"{'matcher':<10}{'accuracy':>10}{'false acc.':>12}{'fit ms':>9}"
+        f"{'frame ms':>10}{'threshold':>11}"
+    )
+    for method, (correct, false_accepts, fit, ms) in rows.items():
+        calibrated = thresholds.get(method)
+        print(
+            f"{method:<10}{correct / len(names):>10.3f}{int(false_accepts):>12}"
+            f"{1000 * fit / args.folds:>9.1f}{ms / args.folds:>10.3f}"
+            f"{(f'{np.mean(calibrated):.3f}' if calibrated else '-'):>11}"
+        )
+
+
+if __name__ == "__main__":  # embeddings() starts worker processes
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--faces", type=int, default=3, help="faces per frame")
+    parser.add_argument("--far", type=float, default=FID_CFG.FID_TARGET_FAR)
+    parser.add_argument("--repeat", type=int, default=20, help="timing rounds")
+    main(parser.parse_args())
@@ -0,0 +1,113 @@
+"""
+Load test of a running webserver: shared /api/history response cache with
+many dashboard clients polling aggregated ranges.
+
+Every client polls a random range (--ranges) every --interval seconds and
+revalidates with If-None-Match, like a browser with the cached response.
+Meanwhile readings of one team are posted to /api/newData (--rate), each one
+invalidates the cached responses containing that team. The cache counters
+are read from /api/metrics before and after: misses are DB queries run,
+hits are DB queries saved.
+
+Run against a test instance, never production: the fake readings show up
+on its live dashboards as --team.
+    python src/benchmarks/bench_history_cache.py --url https://<test host> \
+        --team <team> --cookie '<session_id cookie value>'
+(the cookie is the signed `session_id` cookie of a logged in browser)
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+from tornado import httpclient
+
+
+async def dashboard(client, args, headers, stop, results):
+    etags = {}  # range: last ETag
+    while not stop.is_set():
+        range_ = random.choice(args.ranges.split(","))
+        request_headers = dict(headers)
+        if range_ in etags:
+            request_headers["If-None-Match"] = etags[range_]
+        start = time.perf_counter()
+        response = await client.fetch(
+            f"{args.url}/api/history?range={range_}&points=500",
+            headers=request_headers,
+            raise_error=False,
+        )
+        results.append((response.code, time.perf_counter() - start))
+        if response.code == 200:
+            etags[range_] = response.headers.get("Etag")
+        elif response.code != 304:
+            raise RuntimeError(f"History request failed: {response.code}")
+        await asyncio.sleep(args.interval * random.uniform(0.5, 1.5))
+
+
+async def post_readings(client, url, team, rate, stop):
+    while rate and not stop.is_set():
+        body = {
+            "team_name": team,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "temperature": 21.0,
+        }
+        await client.fetch(url, method="POST", body=json.dumps(body))
+        await asyncio.sleep(1 / rate)
+
+
+async def cache_stats(client, url, headers) -> dict:
+    response = await client.fetch(url + "/api/metrics", headers=headers)
+    return json.loads(response.body)["history_cache"]
+
+
+async def main(args):
+    client = httpclient.AsyncHTTPClient(
+        defaults={"validate_cert": not args.insecure}, max_clients=args.clients
+    )
+    headers = {"Cookie": f"session_id={args.cookie}"}
+
+    before = await cache_stats(client, args.url, headers)
+    stop, results = asyncio.Event(), []
+    tasks = [
+        asyncio.create_task(dashboard(client, args, headers, stop, results))
+        for _ in range(args.clients)
+    ]
+    tasks.append(
+        asyncio.create_task(
+            post_readings(client, args.url + "/api/newData", args.team, args.rate, stop)
+        )
+    )
+    await asyncio.sleep(args.duration)
+    stop.set()
+    await asyncio.gather(*tasks)
+    after = await cache_stats(client, args.url, headers)
+
+    codes = np.array([code for code, _ in results])
+    ms = 1000 * np.array([elapsed for _, elapsed in results])
+    hits = after["hits"] - before["hits"]
+    misses = after["misses"] - before["misses"]
+    print(f"requests        {len(results)} ({len(results) / args.duration:.1f}/s)")
+    print(f"200 / 304       {np.sum(codes == 200)} / {np.sum(codes == 304)}")
+    print(
+        f"latency ms      p50 {np.percentile(ms, 50):.1f}  p95 {np.percentile(ms, 95):.1f}"
+    )
+    print(f"cache hit ratio {hits / max(hits + misses, 1):.3f}")
+    print(f"DB queries      {misses} run, {hits} saved")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", required=True, help="test instance to load")
+    parser.add_argument("--team", required=True, help="team of the fake readings")
+    parser.add_argument("--cookie", required=True, help="session_id cookie value")
+    parser.add_argument("--clients", type=int, default=100, help="dashboards")
+    parser.add_argument("--interval", type=float, default=2.0, help="s between polls")
+    parser.add_argument("--ranges", default="12h,1d,7d,1m,all")
+    parser.add_argument("--rate", type=float, default=0.2, help="readings/s")
+    parser.add_argument("--duration", type=float, default=30.0, help="s")
+    parser.add_argument("--insecure", action="store_true", help="skip TLS checks")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,47 @@
+"""
+Micro-benchmark of MQTT payload parsing (messages/sec).
+
+Run: python src/benchmarks/bench_payload_parser.py [number_of_messages]
+"""
+
+import ast
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from payload_parser import parse_payload  # noqa: E402
+
+JSON_MSG = (
+    b'{"team_name":"blue","timestamp":"2025-11-14T09:40:07.336974",'
+    b'"temperature":20.72,"humidity":64.5,"illumination":1043}'
+)
+LITERAL_MSG = (
+    b"{'team_name': 'blue', 'timestamp': '2025-11-14T09:40:07.336974', "
+    b"'temperature': 20.72, 'humidity': 64.5, 'illumination': None}"
+)
+
+
+def old_parse(raw: bytes) -> dict:
+    """What the dataprocessor did before (decode + ast.literal_eval)."""
+    return ast.literal_eval(raw.decode("utf-8"))
+
+
+def bench(fcn, msg, n) -> float:
+    start = time.perf_counter()
+    for _ in range(n):
+        fcn(msg)
+    return n / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+
+    print(f"{'format':<10}{'parser':<16}{'msg/s':>14}")
+    for fmt, msg in [("json", JSON_MSG), ("literal", LITERAL_MSG)]:
+        for name, fcn in [
+            ("literal_eval", old_parse),
+            ("parse_payload", parse_payload),
+        ]:
+            print(f"{fmt:<10}{name:<16}{bench(fcn, msg, n):>14,.0f}")
@@ -0,0 +1,143 @@
+"""
+Load test of a running webserver: websocket update latency with and
+without heavy /api/history queries running at the same time.
+
+Updates are posted to /api/newData with the current time as timestamp,
+every websocket client measures how long the broadcast took to arrive.
+With DB queries off the IOLoop both phases should report about the same
+latency.
+
+Run against a test instance, never production: the fake updates show up
+on its live dashboards as --team.
+    python src/benchmarks/bench_websocket_history.py --url https://<test host> \
+        --team <team> --cookie '<session_id cookie value>'
+(the cookie is the signed `session_id` cookie of a logged in browser)
+"""
+
+import argparse
+import asyncio
+import json
+import ssl
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+from tornado import httpclient, websocket
+
+
+async def listen(url, team, ssl_ctx, latencies, ready):
+    request = httpclient.HTTPRequest(url, ssl_options=ssl_ctx)
+    conn = await websocket.websocket_connect(request)
+    ready.release()
+    while True:
+        msg = await conn.read_message()
+        if msg is None:
+            return
+        received = time.time()
+        msg = json.loads(msg)
+        if msg["type"] == "update" and msg["payload"]["team"] == team:
+            sent = datetime.fromisoformat(msg["payload"]["time"]).timestamp()
+            latencies.append(received - sent)
+
+
+async def post_updates(client, url, team, rate, stop):
+    while not stop.is_set():
+        body = {
+            "team_name": team,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "temperature": 21.0,
+        }
+        await client.fetch(url, method="POST", body=json.dumps(body))
+        await asyncio.sleep(1 / rate)
+
+
+async def hammer_history(client, url, cookie, stop, counter):
+    while not stop.is_set():
+        response = await client.fetch(
+            url, headers={"Cookie": f"session_id={cookie}"}, raise_error=False
+        )
+        if response.code != 200:
+            raise RuntimeError(f"History request failed: {response.code}")
+        counter[0] += 1
+
+
+async def phase(args, ssl_ctx, history_workers) -> dict:
+    ws_url = args.url.replace("http", "ws", 1) + "/websocket"
+    client = httpclient.AsyncHTTPClient(
+        defaults={"validate_cert": not args.insecure}, max_clients=64
+    )
+
+    latencies, ready = [], asyncio.Semaphore(0)
+    listeners = [
+        asyncio.create_task(listen(ws_url, args.team, ssl_ctx, latencies, ready))
+        for _ in range(args.clients)
+    ]
+    for _ in listeners:
+        await ready.acquire()
+
+    stop, history_done = asyncio.Event(), [0]
+    tasks = [
+        asyncio.create_task(
+            post_updates(client, args.url + "/api/newData", args.team, args.rate, stop)
+        )
+    ]
+    tasks += [
+        asyncio.create_task(
+            hammer_history(
+                client,
+                f"{args.url}/api/history?range={args.range}",
+                args.cookie,
+                stop,
+                history_done,
+            )
+        )
+        for _ in range(history_workers)
+    ]
+
+    await asyncio.sleep(args.duration)
+    stop.set()
+    await asyncio.gather(*tasks)
+    for task in listeners:
+        task.cancel()
+
+    ms = 1000 * np.array(latencies) if latencies else np.zeros(1)
+    return {
+        "history/s": history_done[0] / args.duration,
+        "updates": len(latencies),
+        "p50": np.percentile(ms, 50),
+        "p95": np.percentile(ms, 95),
+        "max": ms.max(),
+    }
+
+
+async def main(args):
+    ssl_ctx = None
+    if args.url.startswith("https") and args.insecure:
+        ssl_ctx = ssl.create_default_context()
+        ssl_ctx.check_hostname = False
+        ssl_ctx.verify_mode = ssl.CERT_NONE
+
+    print(
+        f"{'phase':<10}{'history/s':>10}{'updates':>9}{'p50 ms':>9}"
+        f"{'p95 ms':>9}{'max ms':>9}"
+    )
+    for name, workers in (("idle", 0), ("loaded", args.history_workers)):
+        r = await phase(args, ssl_ctx, workers)
+        print(
+            f"{name:<10}{r['history/s']:>10.1f}{r['updates']:>9}"
+            f"{r['p50']:>9.1f}{r['p95']:>9.1f}{r['max']:>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", required=True, help="test instance to load")
+    parser.add_argument("--team", required=True, help="team of the fake updates")
+    parser.add_argument("--cookie", required=True, help="session_id cookie value")
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--rate", type=float, default=10.0, help="updates/s")
+    parser.add_argument("--history-workers", type=int, default=8)
+    parser.add_argument("--range", default="all", help="history range to query")
+    parser.add_argument("--duration", type=float, default=15.0, help="s per phase")
+    parser.add_argument("--insecure", action="store_true", help="skip TLS checks")
+    asyncio.run(main(parser.parse_args()))
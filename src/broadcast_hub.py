@@ -0,0 +1,120 @@
+import json
+import time
+
+from tornado.websocket import WebSocketClosedError
+
+
+class BroadcastHub:
+    """
+    Fan-out of messages to websocket clients (IOLoop thread only).
+
+    Every message is encoded once, the same frame is written to all clients.
+    A client whose previous frame is still in its socket write buffer is
+    slow: new frames for it wait in per-key slots (e.g. one per team) and a
+    newer frame with the same key replaces the waiting one, which is counted
+    as dropped. The waiting frames are sent once the socket drains.
+
+    Every client has a (hashable) subscription, publish_by() builds and
+    encodes one message per distinct subscription, not per client.
+    """
+
+    def __init__(self, encode=json.dumps):
+        self.encode = encode
+        self._pending = {}  # client: {key: frame} waiting for a slow client
+        self._subscriptions = {}  # client: subscription
+        self._busy = set()  # clients with unflushed writes
+
+        self.published = 0
+        self.sent = 0
+        self.dropped = 0
+        self.fanout_total = 0.0
+        self.fanout_max = 0.0
+
+    def add(self, client, subscription=None):
+        self._pending[client] = {}
+        self._subscriptions[client] = subscription
+
+    def subscribe(self, client, subscription):
+        if client in self._subscriptions:
+            self._subscriptions[client] = subscription
+
+    def discard(self, client):
+        self._pending.pop(client, None)
+        self._subscriptions.pop(client, None)
+        self._busy.discard(client)
+
+    def __len__(self):
+        return len(self._pending)
+
+    def publish(self, message, key=None):
+        """Encode `message` once and send it to all clients; key=None never coalesces."""
+        self.publish_by(lambda subscription: message, key)
+
+    def publish_by(self, make_message, key=None):
+        """
+        Send make_message(subscription) to the clients with that subscription,
+        encoded once per subscription. Clients for which it returns None get
+        nothing.
+        """
+        start = time.perf_counter()
+        key = object() if key is None else key
+
+        groups = {}
+        for client, subscription in self._subscriptions.items():
+            groups.setdefault(subscription, []).append(client)
+
+        for subscription, clients in groups.items():
+            message = make_message(subscription)
+            if message is None:
+                continue
+            frame = self.encode(message)
+            for client in clients:
+                if client in self._busy:
+                    pending = self._pending[client]
+                    if key in pending:
+                        self.dropped += 1
+                    pending[key] = frame
+                else:
+                    self._write(client, [frame])
+
+        elapsed = time.perf_counter() - start
+        self.published += 1
+        self.fanout_total += elapsed
+        self.fanout_max = max(self.fanout_max, elapsed)
+
+    def _write(self, client, frames: list):
+        try:
+            for frame in frames:
+                future = client.write_message(frame)
+                self.sent += 1
+        except WebSocketClosedError:
+            self.discard(client)
+            return
+
+        if not future.done():
+            self._busy.add(client)
+            future.add_done_callback(lambda _: self._drained(client))
+
+    def _drained(self, client):
+        self._busy.discard(client)
+        pending = self._pending.get(client)
+        if pending:
+            frames = list(pending.values())
+            pending.clear()
+            self._write(client, frames)
+
+    def stats(self) -> dict:
+        return {
+            "clients": len(self._pending),
+            "slow_clients": len(self._busy),
+            "subscriptions": len(set(self._subscriptions.values())),
+            "published": self.published,
+            "frames_sent": self.sent,
+            "frames_dropped": self.dropped,
+            "fanout_avg_ms": (
+                round(1000 * self.fanout_total / self.published, 3)
+                if self.published
+                else 0.0
+            ),
+            "fanout_max_ms": round(1000 * self.fanout_max, 3),
+        }
@@ -13,12 +13,40 @@ VALID_TOPICS = {
 }
 TIMESTAMP_REGEX = re.compile(r"^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(?:\.\d+)?$")
 
+# Payload schema (see validator.py)
+# field: (type, required, allowed values / regex / None)
+PAYLOAD_SCHEMA = {
+    "team_name": (str, True, VALID_TEAMS),
+    "timestamp": (str, True, TIMESTAMP_REGEX),
+    "temperature": (float, True, None),
+    "humidity": (float, False, None),
+    "illumination": (float, False, None),
+}
+
+# Pipeline (dataprocessor)======
+PIPELINE_STAGES = {  # name: (worker threads, queue size)
+    "parse": (1, 1000),
+    "db": (1, 1000),
+    "aws": (1, 500),
+    "notify": (2, 500),
+}
+PIPELINE_PUT_TIMEOUT = 5.0  # [s] stage to stage put, item is dropped after that
+PIPELINE_STATS_INTERVAL = 300  # [s] how often are stage counters logged
+
+# Local IPC (dataprocessor -> webserver, see local_ipc.py)
+# readings go over this unix socket, TORNADO_NOTIFY_URL is only the fallback
+IPC_SOCKET_PATH = "newdata.sock"  # in working directory of both processes
+IPC_QUEUE_MAX = 1000
+IPC_BATCH_MAX = 100  # max readings sent with one write
+IPC_RECONNECT_DELAY = 5.0  # [s]
+IPC_MAX_LINE = 64 * 1024  # [B] longer frames close the connection
+
 # Failed queue======
-FAILED_QUEUE_FILE = "failed_queue.json"
-# - If the file doesn't exist, it will be created.
-# - If the file exists, its contents will be cleared.
-with open(FAILED_QUEUE_FILE, "w") as f:
-    pass
+# Append-only journal of failed AWS requests (see retry_journal.py),
+# it is kept across restarts and the directory is created if missing.
+FAILED_QUEUE_DIR = "failed_queue"
+FAILED_QUEUE_SEGMENT_BYTES = 1024 * 1024  # roll over to new segment file after
+FAILED_QUEUE_FSYNC = False  # fsync every append (safer, slower)
 
 # AWS============== (from aimtech guy, dont change)
 URI_BASE = "https://ro7uabkugk.execute-api.eu-central-1.amazonaws.com/Prod"
@@ -27,6 +55,24 @@ URI_BASE = "https://ro7uabkugk.execute-api.eu-central-1.amazonaws.com/Prod"
 EP_MEASUREMENTS = f"{URI_BASE}/measurements"
 EP_ALERTS = f"{URI_BASE}/alerts"
 
+# AWS uploader
+AWS_TIMEOUT = (3.05, 10)  # [s] (connect, read)
+AWS_MAX_CONCURRENCY = 4  # requests in flight = pooled keep-alive connections
+AWS_QUEUE_MAX = 1000  # outbound queue, overflow goes to the failed queue
+AWS_BATCH_SIZE = 25  # max tasks dispatched together (= per batch request)
+AWS_BATCH_MAX_DELAY = 0.5  # [s] how long to wait for more tasks to batch
+AWS_BATCH_UPLOAD = False  # post measurements of one sensor as a JSON list,
+# enable only if the measurements endpoint accepts arrays
+
+# AWS retry (see retry_scheduler.py)
+AWS_BACKOFF_BASE = 2.0  # [s] first retry delay, doubles with every failure
+AWS_BACKOFF_MAX = 300.0  # [s] backoff cap
+AWS_BREAKER_THRESHOLD = 3  # consecutive failures (5xx, timeout) opening the breaker
+AWS_RETRY_RATE = 5.0  # [requests/s] when draining the failed queue
+AWS_RETRY_BATCH = 100  # max tasks per endpoint in one (concurrent) drain round
+AWS_RETRY_TICK = 1.0  # [s] how often the scheduler checks the failed queues
+AWS_RETRY_STATS_INTERVAL = 300  # [s] how often are retry metrics logged
+
 
 def load_aws_credentials():
     with open(AWS_CREDENTIALS_FILE, "r") as f:
@@ -118,6 +164,21 @@ def load_mysql_credentials():
 MYSQL_CREDENTIALS_FILE = "credentials/credentials_mysql.txt"
 MYSQL_CONFIG = load_mysql_credentials()
 
+# Buffered writer (dataprocessor)
+DB_BATCH_SIZE = 50  # flush when this many records are buffered
+DB_BATCH_MAX_AGE = 1.0  # [s] flush when the oldest buffered record is this old
+DB_QUEUE_MAX = 2000  # bounded in-memory queue, producers block when full
+DB_QUEUE_PUT_TIMEOUT = 5.0  # [s] how long a producer waits before giving up
+
+# Rollups (see rollups.py and sql/001_prod_rollup.sql)
+# bucket sizes kept in prod_rollup, updated with every inserted batch
+ROLLUP_INTERVALS = (5 * 60, 15 * 60, 60 * 60, 6 * 60 * 60, 24 * 60 * 60)  # [s]
+
+# Connection pool (webserver)
+DB_POOL_SIZE = 8  # max open connections
+DB_POOL_TIMEOUT = 5.0  # [s] how long a handler waits for a free connection
+DB_POOL_HEALTHCHECK_IDLE = 30.0  # [s] ping connections idle longer than this
+
 
 # COOKIE==============
 def load_cookie_credentials():
@@ -139,9 +200,40 @@ def load_cookie_credentials():
 COOKIE_CREDENTIALS_FILE = "credentials/credentials_cookie.txt"
 COOKIE_CONFIG = load_cookie_credentials()
 
+# Session cache (webserver, see session_cache.py)
+SESSION_CACHE_TTL = 60.0  # [s] how long a looked up session is trusted
+SESSION_CACHE_NEGATIVE_TTL = 10.0  # [s] same for unknown/expired session ids
+SESSION_CACHE_SIZE = 10000  # max cached sessions, least recently used go first
+
+# Recent readings buffer (webserver, see timeseries_buffer.py)
+TS_BUFFER_WINDOW = 60 * 60  # [s] history loaded from DB at startup
+TS_BUFFER_CAPACITY = 8192  # readings kept per team (~2 h at one reading per s)
+TS_BUFFER_FILL_RETRY = 30.0  # [s] next try to load a gap from the DB
+
+# Websocket (webserver)
+WS_COMPRESSION = False  # permessage-deflate, costs CPU per client and frame
+WS_COALESCE_INTERVAL = 0.5  # [s] updates are sent in one batch per tick
+
+# History (webserver)
+HISTORY_CHUNK_ROWS = 2000  # rows read, encoded and sent at once by /api/history
+# windows given by from/to: raw rows up to this span, rollup buckets above it
+HISTORY_RAW_MAX_SPAN = 60 * 60  # [s]
+HISTORY_MAX_BUCKETS = 200  # smallest rollup bucket giving at most this many
+# shared cache of rollup responses (see response_cache.py)
+HISTORY_CACHE_SIZE = 256  # responses
+HISTORY_CACHE_SETTLE = DB_BATCH_MAX_AGE + 1.0  # [s] rollups lag behind live data
+
+# Face login (webserver, see face_service.py)
+FACE_WORKERS = 1  # processes, every one loads its own copy of the models
+FACE_QUEUE_MAX = 4  # recognitions in flight, more are rejected with 503
+FACE_TIMEOUT = 10.0  # [s] answer 504 after this
+
 # MQTT==============
 MQTT_CREDENTIALS_FILE = "credentials/credentials_mqtt.txt"
 MQTT_TOPIC = "ite25/#"
+# webserver subscribes to MQTT_TOPIC itself for live updates (see live_mqtt.py),
+# the dataprocessor then does not notify it
+LIVE_MQTT = False
 
 
 def load_mqtt_credentials():
@@ -176,7 +268,6 @@ def check_files():
     files_to_check = [
         MQTT_CREDENTIALS_FILE,
         MYSQL_CREDENTIALS_FILE,
-        FAILED_QUEUE_FILE,
         AWS_CREDENTIALS_FILE,
         COOKIE_CREDENTIALS_FILE,
     ]
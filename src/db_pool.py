@@ -0,0 +1,167 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import mysql.connector
+from mysql.connector import Error, InterfaceError, OperationalError
+
+import config as conf
+from logger import log
+
+
+class PoolTimeout(Exception):
+    """No connection was returned to the pool in time."""
+
+
+class DBPool:
+    """
+    Fixed size pool of MariaDB connections shared by all handlers.
+
+    Connections are opened lazily (up to `size`) in autocommit mode, so a
+    reused connection never sees a stale snapshot. A connection idle for more
+    than `healthcheck_idle` seconds is pinged (and reconnected) before use,
+    a connection that failed with a connection error is thrown away.
+
+    with DB_POOL.cursor(dictionary=True) as cursor:
+        cursor.execute(...)
+    """
+
+    def __init__(
+        self,
+        size=conf.DB_POOL_SIZE,
+        timeout=conf.DB_POOL_TIMEOUT,
+        healthcheck_idle=conf.DB_POOL_HEALTHCHECK_IDLE,
+        config=None,
+    ):
+        self.size = size
+        self.timeout = timeout
+        self.healthcheck_idle = healthcheck_idle
+        self.config = {**(config or conf.MYSQL_CONFIG), "autocommit": True}
+        self._idle = queue.LifoQueue()  # (connection, last used), warmest first
+        self._lock = threading.Lock()
+        self._created = 0
+
+        self.checkouts = 0
+        self.timeouts = 0
+        self.healthcheck_failures = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    @contextmanager
+    def connection(self):
+        conn = self._acquire()
+        broken = False
+        try:
+            yield conn
+        except (InterfaceError, OperationalError):
+            broken = True
+            raise
+        finally:
+            self._release(conn, broken)
+
+    @contextmanager
+    def cursor(self, dictionary=False, buffered=True):
+        with self.connection() as conn:
+            cursor = conn.cursor(dictionary=dictionary, buffered=buffered)
+            try:
+                yield cursor
+            finally:
+                cursor.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": self.size,
+                "open": self._created,
+                "idle": self._idle.qsize(),
+                "in_use": self._created - self._idle.qsize(),
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "healthcheck_failures": self.healthcheck_failures,
+                "wait_avg_ms": (
+                    round(1000 * self.wait_total / self.checkouts, 3)
+                    if self.checkouts
+                    else 0.0
+                ),
+                "wait_max_ms": round(1000 * self.wait_max, 3),
+            }
+
+    def close(self):
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._discard(conn)
+
+    # === INTERNALS ===
+    def _acquire(self):
+        start = time.monotonic()
+        conn, last_used = self._checkout()
+        if start - last_used > self.healthcheck_idle:
+            conn = self._healthcheck(conn)
+
+        waited = time.monotonic() - start
+        with self._lock:
+            self.checkouts += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+        return conn
+
+    def _checkout(self) -> tuple:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            create = self._created < self.size
+            if create:
+                self._created += 1
+        if create:
+            try:
+                return mysql.connector.connect(**self.config), time.monotonic()
+            except Error:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            with self._lock:
+                self.timeouts += 1
+            raise PoolTimeout(f"No free DB connection in {self.timeout}s") from None
+
+    def _healthcheck(self, conn):
+        try:
+            conn.ping(reconnect=True, attempts=2, delay=0)
+            return conn
+        except Error as e:
+            with self._lock:
+                self.healthcheck_failures += 1
+            log(f"Pooled connection is dead: {e}", level="WARNING", category="DB")
+            self._discard(conn)
+            with self._lock:
+                self._created += 1
+            try:
+                return mysql.connector.connect(**self.config)
+            except Error:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+    def _release(self, conn, broken=False):
+        if broken:
+            self._discard(conn)
+        else:
+            self._idle.put((conn, time.monotonic()))
+
+    def _discard(self, conn):
+        with self._lock:
+            self._created -= 1
+        try:
+            conn.close()
+        except Error:
+            pass
@@ -0,0 +1,108 @@
+"""
+Downsampling of history series for charts, keeps the visual extremes.
+
+lttb   - Largest-Triangle-Three-Buckets: from every bucket the point forming
+         the largest triangle with the previously kept point and the average
+         of the next bucket (follows the shape of the curve)
+minmax - min/max envelope: the minimum and the maximum of every bucket
+"""
+
+import numpy as np
+
+METHODS = ("lttb", "minmax")
+METRICS = ("temperature", "humidity", "lightness")
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Indices of (at most) `n_out` points of series (x, y) picked by LTTB."""
+    n = len(x)
+    if n_out >= n:
+        return np.arange(n)
+    if n_out < 3:  # no bucket between the first and the last point
+        return np.array([0, n - 1][: max(n_out, 0)], dtype=np.intp)
+
+    # n_out - 2 buckets between the always kept first and last point
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.intp)
+    out = np.empty(n_out, dtype=np.intp)
+    out[0], out[-1] = 0, n - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_hi = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[hi:next_hi].mean()
+        avg_y = y[hi:next_hi].mean()
+        area = np.abs(
+            (x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a])
+        )
+        a = lo + int(area.argmax())
+        out[i + 1] = a
+    return out
+
+
+def minmax(y: np.ndarray, n_out: int) -> np.ndarray:
+    """Sorted indices of the min and max of n_out / 2 equal buckets of `y`."""
+    n = len(y)
+    if n_out >= n:
+        return np.arange(n)
+    if n_out < 2:  # no bucket, the first point
+        return np.arange(max(n_out, 0))
+
+    starts = np.linspace(0, n, n_out // 2 + 1).astype(np.intp)[:-1]
+    bucket = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, n)))
+    picked = []
+    for reduce in (np.minimum, np.maximum):
+        extreme = reduce.reduceat(y, starts)
+        hits = np.flatnonzero(y == extreme[bucket])
+        # first hit in every bucket
+        _, first = np.unique(bucket[hits], return_index=True)
+        picked.append(hits[first])
+    return np.unique(np.concatenate(picked))
+
+
+def downsample(x: np.ndarray, columns: dict, points: int, method="lttb") -> np.ndarray:
+    """
+    Row indices, at most `points` of them, of columns (series sharing the
+    time axis `x`). Every column is downsampled on its own (NaNs skipped)
+    to its share of `points`, the result is the union (evenly thinned out
+    if it is still too long). With fewer than 2 points per column only the
+    first and the last row are kept.
+    """
+    if len(x) <= points:
+        return np.arange(len(x))
+    valid = [np.flatnonzero(~np.isnan(y)) for y in columns.values()]
+    share = points // max(sum(len(v) > 0 for v in valid), 1)
+    if share < 2:  # too few points to give every column its own
+        return np.array([0, len(x) - 1][:points], dtype=np.intp)
+    keep = []
+    for y, rows in zip(columns.values(), valid):
+        if method == "minmax":
+            picked = minmax(y[rows], share)
+        else:
+            picked = lttb(x[rows], y[rows], share)
+        keep.append(rows[picked])
+    keep = np.unique(np.concatenate(keep)) if keep else np.arange(len(x))
+    if len(keep) > points:
+        keep = keep[np.linspace(0, len(keep) - 1, points).astype(np.intp)]
+    return keep
+
+
+def downsample_records(
+    records: list, points: int, method="lttb", metrics=METRICS
+) -> list:
+    """Downsample history rows (dicts, ordered by time) per team, see downsample()."""
+    by_team = {}
+    for record in records:
+        by_team.setdefault(record["team"], []).append(record)
+
+    out = []
+    for rows in by_team.values():
+        x = np.array([r["time"].timestamp() for r in rows])
+        columns = {
+            m: np.array([r[m] for r in rows], dtype=np.float64)  # None -> NaN
+            for m in metrics
+        }
+        out.extend(rows[i] for i in downsample(x, columns, points, method))
+
+    out.sort(key=lambda record: record["time"])
+    return out
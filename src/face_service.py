@@ -0,0 +1,179 @@
+"""
+Face recognition for the webserver in a dedicated process pool, so model
+loading and inference never block the IOLoop.
+
+The models are loaded by every worker process (faceid.recognize.init_worker)
+in the background after start(), the server accepts requests meanwhile and
+face logins get FaceUnavailable until the pool is warm. At most
+`queue_max` recognitions are in flight, more are rejected right away.
+"""
+
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import config as conf
+from faceid import recognize
+from logger import log
+
+
+class FaceUnavailable(Exception):
+    """Models still loading, pool broken or too many requests queued."""
+
+
+class FaceService:
+    def __init__(
+        self,
+        workers=conf.FACE_WORKERS,
+        queue_max=conf.FACE_QUEUE_MAX,
+        timeout=conf.FACE_TIMEOUT,
+    ):
+        self.workers = workers
+        self.queue_max = queue_max
+        self.timeout = timeout
+        self._pool = None
+        self._warm = None  # warm-up task
+        self.ready = False
+        self.in_flight = 0
+
+        self.started_at = None
+        self.startup_seconds = None
+        self.model_load_seconds = None
+        self.requests = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.latency_total = 0.0  # queue wait + inference
+        self.latency_max = 0.0
+        self.inference_total = 0.0
+        self.inference_max = 0.0
+
+    def start(self):
+        """Create the pool and warm it up in the background (IOLoop thread)."""
+        if self._pool is not None:
+            return
+        self.ready = False
+        self.started_at = time.perf_counter()
+        # spawn: forking the threaded webserver is not safe with OpenCV. The
+        # workers re-import the main module, so they build the module-level
+        # objects of run_webserver.py too (DB pool, caches, executors, MQTT
+        # client); those open no connections until used and the server only
+        # starts under __main__.
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=recognize.init_worker,
+        )
+        self._warm = asyncio.ensure_future(self._warm_up(self._pool))
+
+    async def _warm_up(self, pool):
+        loop = asyncio.get_running_loop()
+        try:
+            loads = await asyncio.gather(
+                *(
+                    loop.run_in_executor(pool, recognize.worker_ready)
+                    for _ in range(self.workers)
+                )
+            )
+        except Exception as e:
+            log(f"Face recognizer failed to load: {e}", level="ERROR", category="FACE")
+            self._reset(pool)
+            return
+        self.model_load_seconds = max(loads)
+        self.startup_seconds = time.perf_counter() - self.started_at  # type: ignore
+        self.ready = True
+        log(
+            f"Face recognizer ready in {self.startup_seconds:.1f}s "
+            f"({self.workers} workers).",
+            category="FACE",
+        )
+
+    def _reset(self, pool):
+        """Drop a broken pool, the next request starts a new one."""
+        if self._pool is pool:
+            self._pool = None
+            self.ready = False
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def stop(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+            self.ready = False
+
+    async def recognize(self, image_bytes: bytes) -> str:
+        """
+        Name recognized in the encoded image. Raises FaceUnavailable,
+        asyncio.TimeoutError after `timeout` seconds (the worker finishes the
+        image anyway) and ValueError for images that cannot be processed.
+        """
+        self.start()  # lazy, no-op once started
+        if not self.ready:
+            raise FaceUnavailable("Face recognition is starting, try again later")
+        if self.in_flight >= self.queue_max:
+            self.rejected += 1
+            raise FaceUnavailable("Face recognition is busy, try again later")
+
+        pool = self._pool
+        loop = asyncio.get_running_loop()
+        self.requests += 1
+        start = time.perf_counter()
+        try:
+            future = pool.submit(recognize.recognize_encoded, image_bytes)
+            # counted until the worker is done with it, also after a timeout
+            self.in_flight += 1
+            future.add_done_callback(
+                lambda _: loop.call_soon_threadsafe(self._recognized)
+            )
+            name, inference = await asyncio.wait_for(
+                asyncio.wrap_future(future), self.timeout
+            )
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        except BrokenProcessPool:
+            self.errors += 1
+            log("Face worker died, restarting pool.", level="ERROR", category="FACE")
+            self._reset(pool)
+            raise FaceUnavailable("Face recognition failed, try again later")
+        except Exception:
+            self.errors += 1
+            raise
+
+        latency = time.perf_counter() - start
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+        self.inference_total += inference
+        self.inference_max = max(self.inference_max, inference)
+        return name
+
+    def _recognized(self):
+        self.in_flight -= 1
+
+    def stats(self) -> dict:
+        done = self.requests - self.timeouts - self.errors
+        return {
+            "ready": self.ready,
+            "workers": self.workers,
+            "startup_s": (
+                round(self.startup_seconds, 3) if self.startup_seconds else None
+            ),
+            "model_load_s": (
+                round(self.model_load_seconds, 3) if self.model_load_seconds else None
+            ),
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "latency_avg_ms": (
+                round(1000 * self.latency_total / done, 1) if done else None
+            ),
+            "latency_max_ms": round(1000 * self.latency_max, 1),
+            "inference_avg_ms": (
+                round(1000 * self.inference_total / done, 1) if done else None
+            ),
+            "inference_max_ms": round(1000 * self.inference_max, 1),
+        }
@@ -0,0 +1,101 @@
+"""
+Enrolment of users into the face gallery (FID_GALLERY_FILE) without
+retraining, the webserver picks the change up on the next face login.
+
+    python src/faceid/enroll.py add NAME IMAGE_OR_FOLDER... [--replace]
+    python src/faceid/enroll.py remove NAME
+    python src/faceid/enroll.py rebuild    (whole dataset, uses the embedding cache)
+    python src/faceid/enroll.py calibrate [--far 0.01]
+    python src/faceid/enroll.py list
+
+The match threshold is calibrated by rebuild and calibrate, add keeps it.
+"""
+
+from imutils import paths
+import numpy as np
+import argparse
+import os
+
+try:
+    import face_config as FID_CFG
+    from extract_embeddings import embed_files, embeddings
+    from gallery import Gallery
+except:  # noqa: E722
+    import faceid.face_config as FID_CFG
+    from faceid.extract_embeddings import embed_files, embeddings
+    from faceid.gallery import Gallery
+
+
+def enroll(name: str, imagePaths: list[str], replace=False, workers=None) -> int:
+    """Append embeddings of `name` from the images, returns how many faces."""
+    vecs = [vec for vec in embed_files(imagePaths, workers) if vec is not None]
+    gallery = Gallery()
+    if replace:
+        gallery.remove(name)
+    if vecs:
+        gallery.add(name, np.vstack(vecs))
+    gallery.save()
+    return len(vecs)
+
+
+def calibrate(gallery: Gallery, far=FID_CFG.FID_TARGET_FAR):
+    accepted = gallery.calibrate(far, FID_CFG.FID_CLASSIFIER)
+    print(
+        f"[INFO] threshold {gallery.threshold} (cosine distance): "
+        f"{far:.1%} impostors, {accepted:.1%} genuine faces accepted"
+    )
+
+
+def rebuild() -> Gallery:
+    """Calibrated gallery of FID_DATASET_FOLDER (one name per subfolder)."""
+    names, embedds = embeddings()
+    gallery = Gallery()
+    gallery.clear()
+    for name in sorted(set(names)):
+        gallery.add(name, embedds[[n == name for n in names]])
+    calibrate(gallery)
+    gallery.save()
+    return gallery
+
+
+def _image_paths(args: list[str]) -> list[str]:
+    found = []
+    for arg in args:
+        found.extend(sorted(paths.list_images(arg)) if os.path.isdir(arg) else [arg])
+    return found
+
+
+if __name__ == "__main__":  # embed_files() starts worker processes
+    parser = argparse.ArgumentParser(description="Manage the face gallery.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    cmd = commands.add_parser("add", help="enroll images of one user")
+    cmd.add_argument("name")
+    cmd.add_argument("images", nargs="+", help="image files or folders")
+    cmd.add_argument("--replace", action="store_true", help="drop older samples")
+    cmd.add_argument("--workers", type=int, default=None)
+    cmd = commands.add_parser("remove", help="remove a user")
+    cmd.add_argument("name")
+    commands.add_parser("rebuild", help=f"enroll {FID_CFG.FID_DATASET_FOLDER}")
+    cmd = commands.add_parser("calibrate", help="set the match threshold")
+    cmd.add_argument("--far", type=float, default=FID_CFG.FID_TARGET_FAR)
+    commands.add_parser("list", help="enrolled users")
+    args = parser.parse_args()
+
+    if args.command == "add":
+        images = _image_paths(args.images)
+        n = enroll(args.name, images, args.replace, args.workers)
+        print(f"[INFO] enrolled {n} faces of {args.name} ({len(images)} images)")
+    elif args.command == "remove":
+        gallery = Gallery()
+        gallery.remove(args.name)
+        gallery.save()
+    elif args.command == "rebuild":
+        print(f"[INFO] gallery of {len(rebuild())} faces written")
+    elif args.command == "calibrate":
+        gallery = Gallery()
+        calibrate(gallery, args.far)
+        gallery.save()
+    elif args.command == "list":
+        gallery = Gallery()
+        for name, count in gallery.counts().items():
+            print(name, count)
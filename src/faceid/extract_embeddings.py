@@ -1,5 +1,7 @@
+from concurrent.futures import ProcessPoolExecutor
 from imutils import paths
 import numpy as np
+import hashlib
 import imutils
 import cv2
 import os
@@ -9,91 +11,190 @@ try:
 except:  # noqa: E722
     import faceid.face_config as FID_CFG
 
+# models of a worker process, loaded once by _init_worker
+_detector = None
+_embedder = None
+
+
+def _init_worker():
+    global _detector, _embedder
+    # one thread per process, the pool itself uses all cores
+    cv2.setNumThreads(1)
+    _detector = cv2.dnn.readNetFromCaffe(
+        FID_CFG.FID_DEPLOY_FILE, FID_CFG.FID_CAFFE_FILE
+    )
+    _embedder = cv2.dnn.readNetFromTorch(FID_CFG.FID_OPENFACE_FILE)
+
+
+def _embed_batch(imagePaths: list[str]) -> list:
+    """
+    Embeddings of a batch of images (one face per image) computed with one
+    detector and one embedder forward pass. None for images without a face
+    and for images that cannot be read.
+    """
+    # load the images, resize them to have a width of 600 pixels (while
+    # maintaining the aspect ratio)
+    loaded = [cv2.imread(p) for p in imagePaths]
+    for p, image in zip(imagePaths, loaded):
+        if image is None:
+            print("[WARNING] cannot read image {}, skipped".format(p))
+    images = [imutils.resize(image, width=600) for image in loaded if image is not None]
+    if not images:
+        return [None] * len(imagePaths)
+
+    # apply OpenCV's deep learning-based face detector to localize
+    # faces in all the images at once
+    imageBlob = cv2.dnn.blobFromImages(
+        [cv2.resize(image, (300, 300)) for image in images],
+        1.0,
+        (300, 300),
+        (104.0, 177.0, 123.0),
+        swapRB=False,
+        crop=False,
+    )
+    _detector.setInput(imageBlob)  # type: ignore
+    # rows of (image index, class, confidence, box)
+    detections = _detector.forward()[0, 0]  # type: ignore
+
+    faces = []
+    for k, image in enumerate(images):
+        (h, w) = image.shape[:2]
+        own = detections[detections[:, 0] == k]
+        if len(own) == 0:
+            faces.append(None)
+            continue
+
+        # we're making the assumption that each image has only ONE
+        # face, so find the bounding box with the largest probability
+        best = own[np.argmax(own[:, 2])]
+
+        # ensure that the detection with the largest probability also
+        # means our minimum probability test (thus helping filter out
+        # weak detections)
+        if best[2] <= FID_CFG.FID_THRESHOLD:
+            faces.append(None)
+            continue
+
+        # compute the (x, y)-coordinates of the bounding box for the face
+        box = best[3:7] * np.array([w, h, w, h])
+        (startX, startY, endX, endY) = box.astype("int")
+
+        # extract the face ROI and ensure it is sufficiently large
+        face = image[startY:endY, startX:endX]
+        (fH, fW) = face.shape[:2]
+        faces.append(face if fW >= 20 and fH >= 20 else None)
+
+    # pass all the face ROIs through our face embedding model to obtain
+    # the 128-d quantification of every face
+    found = [face for face in faces if face is not None]
+    if not found:
+        return [None] * len(imagePaths)
+    faceBlob = cv2.dnn.blobFromImages(
+        found, 1.0 / 255, (96, 96), (0, 0, 0), swapRB=True, crop=False
+    )
+    _embedder.setInput(faceBlob)  # type: ignore
+    vecs = iter(_embedder.forward())  # type: ignore
+    vecs = iter([None if face is None else next(vecs).flatten() for face in faces])
+    # back to one entry per path, unreadable images have no face
+    return [None if image is None else next(vecs) for image in loaded]
+
+
+def _file_hash(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def _models_hash() -> str:
+    """Hash of the model files, embeddings of other models are not reused."""
+    models = (
+        FID_CFG.FID_DEPLOY_FILE,
+        FID_CFG.FID_CAFFE_FILE,
+        FID_CFG.FID_OPENFACE_FILE,
+    )
+    return hashlib.sha1("".join(_file_hash(p) for p in models).encode()).hexdigest()
+
+
+def _load_cache(models: str) -> dict:
+    """
+    Content hash -> embedding (None: no face found) from the cache file,
+    empty if it was computed by other models (`models` is _models_hash()).
+    """
+    if not os.path.exists(FID_CFG.FID_EMBEDDINGS_CACHE):
+        return {}
+    data = np.load(FID_CFG.FID_EMBEDDINGS_CACHE)
+    if "models" not in data or str(data["models"]) != models:
+        print("[INFO] models changed, embedding cache is not used")
+        return {}
+    return {
+        h: (vec if found else None)
+        for h, vec, found in zip(data["hashes"], data["vectors"], data["found"])
+    }
+
+
+def _save_cache(cache: dict, models: str):
+    hashes = sorted(cache)
+    found = np.array([cache[h] is not None for h in hashes], dtype=bool)
+    vectors = np.zeros((len(hashes), 128), dtype=np.float32)
+    for k, h in enumerate(hashes):
+        if found[k]:
+            vectors[k] = cache[h]
+    np.savez(
+        FID_CFG.FID_EMBEDDINGS_CACHE,
+        hashes=np.array(hashes, dtype="U40"),
+        vectors=vectors,
+        found=found,
+        models=np.array(models, dtype="U40"),
+    )
+
+
+def embed_files(imagePaths: list[str], workers=None, batch_size=16) -> list:
+    """
+    Embedding of every image (None if no face was found), in batches of
+    `batch_size` by a pool of `workers` processes (default: all cores).
+    """
+    batches = [
+        imagePaths[i : i + batch_size] for i in range(0, len(imagePaths), batch_size)
+    ]
+    vecs = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        for n, batch in enumerate(pool.map(_embed_batch, batches)):
+            print("[INFO] processed batch {}/{}".format(n + 1, len(batches)))
+            vecs.extend(batch)
+    return vecs
+
+
+def embeddings(workers=None, batch_size=16) -> tuple[list[str], np.ndarray]:
+    """
+    (names, embeddings) of all dataset images. Only images not in the
+    embedding cache (new or changed content) are processed, see embed_files().
+    """
+    # grab the paths to the input images in our dataset
+    print("[INFO] quantifying faces...")
+    imagePaths = sorted(paths.list_images(FID_CFG.FID_DATASET_FOLDER))
+    hashes = [_file_hash(p) for p in imagePaths]
 
-def embeddings() -> tuple[list[str], np.ndarray]:
-    detector = cv2.dnn.readNetFromCaffe(FID_CFG.FID_DEPLOY_FILE, FID_CFG.FID_CAFFE_FILE)
+    models = _models_hash()
+    cache = _load_cache(models)
+    todo = sorted({h: p for h, p in zip(hashes, imagePaths) if h not in cache}.items())
+    print(f"[INFO] {len(imagePaths) - len(todo)} images cached, {len(todo)} to process")
 
-    # load our serialized face embedding model from disk
-    print("[INFO] loading face recognizer...")
-    embedder = cv2.dnn.readNetFromTorch(FID_CFG.FID_OPENFACE_FILE)
+    if todo:
+        vecs = embed_files([p for _, p in todo], workers, batch_size)
+        for (h, _), vec in zip(todo, vecs):
+            cache[h] = vec
 
-    # grab the paths to the input images in our dataset
-    print("[INFO] quantifying faces...")
-    imagePaths = list(paths.list_images(FID_CFG.FID_DATASET_FOLDER))
+    # drop images no longer in the dataset
+    cache = {h: cache[h] for h in hashes}
+    _save_cache(cache, models)
 
     # initialize our lists of extracted facial embeddings and
     # corresponding people names
     knownEmbeddings = []
     knownNames = []
-
-    # initialize the total number of faces processed
-    total = 0
-
-    # loop over the image paths
-    for i, imagePath in enumerate(imagePaths):
-        # extract the person name from the image path
-        print("[INFO] processing image {}/{}".format(i + 1, len(imagePaths)))
-        name = imagePath.split(os.path.sep)[-2]
-
-        # load the image, resize it to have a width of 600 pixels (while
-        # maintaining the aspect ratio), and then grab the image
-        # dimensions
-        image: np.ndarray = cv2.imread(imagePath)  # type: ignore
-        image = imutils.resize(image, width=600)
-        (h, w) = image.shape[:2]
-
-        # construct a blob from the image
-        imageBlob = cv2.dnn.blobFromImage(
-            cv2.resize(image, (300, 300)),
-            1.0,
-            (300, 300),
-            (104.0, 177.0, 123.0),
-            swapRB=False,
-            crop=False,
-        )
-
-        # apply OpenCV's deep learning-based face detector to localize
-        # faces in the input image
-        detector.setInput(imageBlob)
-        detections = detector.forward()
-
-        # ensure at least one face was found
-        if len(detections) > 0:
-            # we're making the assumption that each image has only ONE
-            # face, so find the bounding box with the largest probability
-            i = np.argmax(detections[0, 0, :, 2])
-            confidence = detections[0, 0, i, 2]
-
-            # ensure that the detection with the largest probability also
-            # means our minimum probability test (thus helping filter out
-            # weak detections)
-            if confidence > FID_CFG.FID_THRESHOLD:
-                # compute the (x, y)-coordinates of the bounding box for
-                # the face
-                box = detections[0, 0, i, 3:7] * np.array([w, h, w, h])
-                (startX, startY, endX, endY) = box.astype("int")
-
-                # extract the face ROI and grab the ROI dimensions
-                face = image[startY:endY, startX:endX]
-                (fH, fW) = face.shape[:2]
-
-                # ensure the face width and height are sufficiently large
-                if fW < 20 or fH < 20:
-                    continue
-
-                # construct a blob for the face ROI, then pass the blob
-                # through our face embedding model to obtain the 128-d
-                # quantification of the face
-                faceBlob = cv2.dnn.blobFromImage(
-                    face, 1.0 / 255, (96, 96), (0, 0, 0), swapRB=True, crop=False
-                )
-                embedder.setInput(faceBlob)
-                vec = embedder.forward()
-
-                # add the name of the person + corresponding face
-                # embedding to their respective lists
-                knownNames.append(name)
-                knownEmbeddings.append(vec.flatten())
-                total += 1
+    for imagePath, h in zip(imagePaths, hashes):
+        if cache[h] is not None:
+            # extract the person name from the image path
+            knownNames.append(imagePath.split(os.path.sep)[-2])
+            knownEmbeddings.append(cache[h])
 
     return (knownNames, np.vstack(knownEmbeddings))
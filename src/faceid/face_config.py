@@ -10,10 +10,18 @@ FID_DEPLOY_FILE = base + "objects/deploy.prototxt"
 FID_CAFFE_FILE = base + "objects/res10_300x300_ssd_iter_140000.caffemodel"
 FID_OPENFACE_FILE = base + "objects/openface_nn4.small2.v1.t7"
 FID_RECOGNIZER_FILE = base + "objects/recognizer.pickle"
+FID_EMBEDDINGS_CACHE = base + "objects/embeddings.npz"  # content hash -> embedding
+FID_GALLERY_FILE = base + "objects/gallery.npz"  # enrolled users, see enroll.py
 
 FID_DATASET_FOLDER = base + "dataset"
 
 FID_THRESHOLD = 0.5  # magic number
+# gallery matcher (used once users are enrolled): "nn" nearest sample,
+# "centroid" nearest mean of the user; "svm" = recognizer.pickle
+FID_CLASSIFIER = "nn"
+FID_MATCH_THRESHOLD = 0.5  # max cosine distance of a match, until calibrated
+FID_TARGET_FAR = 0.01  # false accept rate the threshold is calibrated for
+FID_UNKNOWN = "unknown"  # name of not recognized faces (and of the dataset folder)
 
 
 def check_files():
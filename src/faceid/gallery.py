@@ -0,0 +1,207 @@
+import numpy as np
+import os
+
+try:
+    import face_config as FID_CFG
+except:  # noqa: E722
+    import faceid.face_config as FID_CFG
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize rows, cosine similarity is then a dot product."""
+    vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, 128)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class Gallery:
+    """
+    Persistent store of enrolled face embeddings (FID_GALLERY_FILE) with a
+    cosine similarity matcher: all faces of a frame are scored with one
+    matrix product against either the per-name centroids or all samples
+    (nearest neighbour), faces farther than the calibrated threshold are
+    "unknown".
+
+    Adding samples only updates the per-name sums, O(new samples), there is
+    no retraining. Processes using the gallery pick up changes written by
+    another process (enroll.py) with reload_if_changed(). path=None keeps
+    the gallery in memory only.
+    """
+
+    def __init__(self, path=FID_CFG.FID_GALLERY_FILE):
+        self.path = path
+        self.mtime = None
+        self.threshold = None  # cosine distance from calibrate()
+        self._labels = []  # per sample
+        self._chunks = []  # normalized sample vectors, one array per add()
+        self._sums = {}  # name: sum of normalized vectors
+        self._counts = {}  # name: number of samples
+        self._centroids = None  # (names, matrix), built on demand
+        self._samples = None  # (names, samples sorted by name, first index per name)
+        if path and os.path.exists(path):
+            self.load()
+
+    def __len__(self):
+        return len(self._labels)
+
+    def names(self) -> list[str]:
+        return sorted(self._counts)
+
+    def counts(self) -> dict:
+        """name: number of samples"""
+        return {name: self._counts[name] for name in self.names()}
+
+    def vectors(self) -> tuple[list[str], np.ndarray]:
+        """(label per sample, normalized sample vectors)."""
+        if not self._chunks:
+            return [], np.zeros((0, 128), dtype=np.float32)
+        return list(self._labels), np.vstack(self._chunks)
+
+    # === UPDATES ===
+    def add(self, name: str, vectors: np.ndarray):
+        vectors = normalize(vectors)
+        if len(vectors) == 0:
+            return
+        self._labels.extend([name] * len(vectors))
+        self._chunks.append(vectors)
+        self._sums[name] = self._sums.get(name, 0) + vectors.sum(axis=0)
+        self._counts[name] = self._counts.get(name, 0) + len(vectors)
+        self._centroids = self._samples = None
+
+    def clear(self):
+        self._labels, self._chunks, self._sums, self._counts = [], [], {}, {}
+        self._centroids = self._samples = None
+
+    def remove(self, name: str):
+        labels, vectors = self.vectors()
+        keep = np.array([label != name for label in labels], dtype=bool)
+        self._labels = [label for label in labels if label != name]
+        self._chunks = [vectors[keep]] if keep.any() else []
+        self._sums.pop(name, None)
+        self._counts.pop(name, None)
+        self._centroids = self._samples = None
+
+    # === FILE ===
+    def load(self):
+        data = np.load(self.path)
+        labels = [str(label) for label in data["labels"]]
+        vectors = data["vectors"]
+        self._labels = labels
+        self._chunks = [vectors] if labels else []
+        self._sums, self._counts = {}, {}
+        self.threshold = float(data["threshold"]) if "threshold" in data else None
+        for name in set(labels):
+            own = vectors[np.array(labels) == name]
+            self._sums[name] = own.sum(axis=0)
+            self._counts[name] = len(own)
+        self._centroids = self._samples = None
+        self.mtime = os.stat(self.path).st_mtime_ns
+
+    def save(self):
+        """Written to a temporary file first, readers never see a partial file."""
+        labels, vectors = self.vectors()
+        tmp = self.path + ".tmp.npz"
+        extra = {} if self.threshold is None else {"threshold": self.threshold}
+        np.savez(tmp, labels=np.array(labels, dtype=str), vectors=vectors, **extra)
+        os.replace(tmp, self.path)
+        self.mtime = os.stat(self.path).st_mtime_ns
+
+    def reload_if_changed(self) -> bool:
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return False
+        if mtime == self.mtime:
+            return False
+        self.load()
+        return True
+
+    # === MATCHER ===
+    def centroids(self) -> tuple[list[str], np.ndarray]:
+        """(names, normalized mean vector of every name)."""
+        if self._centroids is None:
+            names = self.names()
+            sums = np.array([self._sums[name] for name in names], dtype=np.float32)
+            self._centroids = (names, normalize(sums))
+        return self._centroids
+
+    def samples(self) -> tuple[list[str], np.ndarray, np.ndarray]:
+        """(names, samples grouped by name, index of the first one of every name)."""
+        if self._samples is None:
+            labels, vectors = self.vectors()
+            order = np.argsort(np.array(labels), kind="stable")
+            names = self.names()
+            starts = np.cumsum([0] + [self._counts[name] for name in names[:-1]])
+            self._samples = (names, vectors[order], starts)
+        return self._samples
+
+    def scores(self, vectors: np.ndarray, method="nn") -> tuple[list[str], np.ndarray]:
+        """
+        (names, similarity of every vector to every name), one matrix
+        product: to the centroid, or to the nearest sample of the name (nn).
+        """
+        vectors = normalize(vectors)
+        if method == "centroid":
+            names, centroids = self.centroids()
+            return names, vectors @ centroids.T
+        names, samples, starts = self.samples()
+        return names, np.maximum.reduceat(vectors @ samples.T, starts, axis=1)
+
+    def match(self, vectors: np.ndarray, method="nn", threshold=None) -> list:
+        """
+        (name, cosine similarity) of the best match of every vector, name is
+        FID_UNKNOWN if the cosine distance is above the threshold (given,
+        calibrated or FID_MATCH_THRESHOLD).
+        """
+        if threshold is None:
+            threshold = self.threshold
+        if threshold is None:
+            threshold = FID_CFG.FID_MATCH_THRESHOLD
+        names, scores = self.scores(vectors, method)
+        best = scores.argmax(axis=1)
+        similarity = scores[np.arange(len(best)), best]
+        return [
+            (names[j] if 1 - sim <= threshold else FID_CFG.FID_UNKNOWN, float(sim))
+            for j, sim in zip(best, similarity)
+        ]
+
+    def calibrate(self, far=FID_CFG.FID_TARGET_FAR, method="nn") -> float:
+        """
+        Set the threshold so that at most `far` of impostor faces are
+        accepted, leave-one-out on the enrolled samples: every sample is
+        matched against the others, samples of FID_UNKNOWN are impostors
+        only. Returns the share of genuine faces accepted.
+        """
+        labels, vectors = self.vectors()
+        labels = np.array(labels)
+        names = np.array(self.names())
+        is_own = labels[:, None] == names[None, :]
+        is_other = ~is_own & (names != FID_CFG.FID_UNKNOWN)[None, :]
+        # impostors: samples with another enrolled name to be confused with
+        has_other = is_other.any(axis=1)
+        if not has_other.any():
+            return 1.0  # nothing to calibrate on, threshold unchanged
+
+        if method == "centroid":
+            # own centroid without the sample itself
+            sums = np.array([self._sums[name] for name in names])
+            counts = np.array([self._counts[name] for name in names])
+            own = np.searchsorted(names, labels)
+            scores = vectors @ normalize(sums).T
+            rest = sums[own] - vectors
+            lonely = counts[own] == 1  # no other sample to match
+            scores[np.arange(len(labels)), own] = np.where(
+                lonely, -1.0, np.sum(vectors * normalize(rest), axis=1)
+            )
+        else:
+            similarity = vectors @ vectors.T
+            np.fill_diagonal(similarity, -1.0)
+            order = np.argsort(labels, kind="stable")
+            starts = np.searchsorted(labels[order], names)
+            scores = np.maximum.reduceat(similarity[:, order], starts, axis=1)
+
+        impostor = np.where(is_other, scores, -1.0).max(axis=1)[has_other]
+        genuine = np.where(is_own, scores, -1.0).max(axis=1)
+        genuine = genuine[labels != FID_CFG.FID_UNKNOWN]
+        self.threshold = float(np.quantile(1 - impostor, far))
+        return float(np.mean(1 - genuine <= self.threshold)) if len(genuine) else 1.0
@@ -2,11 +2,14 @@ import numpy as np
 import imutils
 import cv2
 import pickle
+import time
 
 try:
     import face_config as FID_CFG
+    from gallery import Gallery
 except:  # noqa: E722
     import faceid.face_config as FID_CFG
+    from faceid.gallery import Gallery
 
 
 class Recognizer:
@@ -17,12 +20,16 @@ class Recognizer:
         self.embedder = cv2.dnn.readNetFromTorch(FID_CFG.FID_OPENFACE_FILE)
         self.recognizer = pickle.loads(open(FID_CFG.FID_RECOGNIZER_FILE, "rb").read())
         self.le = pickle.loads(open(FID_CFG.FID_LE_FILE, "rb").read())
+        # enrolled users (enroll.py), used instead of the SVM once not empty
+        self.gallery = Gallery() if FID_CFG.FID_CLASSIFIER != "svm" else None
 
     def recognize(self, image):
         image = imutils.resize(image, width=600)
         (h, w) = image.shape[:2]
 
         print("Processing image")
+        if self.gallery is not None:
+            self.gallery.reload_if_changed()  # new enrolments, no restart needed
 
         imageBlob = cv2.dnn.blobFromImage(
             cv2.resize(image, (300, 300)),
@@ -36,7 +43,7 @@ class Recognizer:
         self.detector.setInput(imageBlob)
         detections = self.detector.forward()
 
-        faces: dict[str, int] = {}
+        rois = []
 
         # loop over the detections
         for i in range(0, detections.shape[2]):
@@ -58,26 +65,61 @@ class Recognizer:
                 # ensure the face width and height are sufficiently large
                 if fW < 20 or fH < 20:
                     continue
+                rois.append(face)
 
-                # construct a blob for the face ROI, then pass the blob
-                # through our face embedding model to obtain the 128-d
-                # quantification of the face
-                faceBlob = cv2.dnn.blobFromImage(
-                    face, 1.0 / 255, (96, 96), (0, 0, 0), swapRB=True, crop=False
-                )
-                self.embedder.setInput(faceBlob)
-                vec = self.embedder.forward()
-
-                # perform classification to recognize the face
-                preds = self.recognizer.predict_proba(vec)[0]
-                j = np.argmax(preds)
-                proba = preds[j]
-                name = self.le.classes_[j]
-
-                faces[name] = proba
+        if not rois:
+            return FID_CFG.FID_UNKNOWN
+
+        # construct one blob of all the face ROIs, then pass it through our
+        # face embedding model to obtain the 128-d quantification of every
+        # face
+        faceBlob = cv2.dnn.blobFromImages(
+            rois, 1.0 / 255, (96, 96), (0, 0, 0), swapRB=True, crop=False
+        )
+        self.embedder.setInput(faceBlob)
+        vecs = self.embedder.forward()
+
+        # perform classification to recognize all the faces at once
+        if self.gallery is not None and len(self.gallery):
+            matches = self.gallery.match(vecs, method=FID_CFG.FID_CLASSIFIER)
+        else:
+            preds = self.recognizer.predict_proba(vecs)
+            best = preds.argmax(axis=1)
+            matches = [(self.le.classes_[j], p[j]) for j, p in zip(best, preds)]
+
+        faces: dict[str, float] = {}
+        for name, score in matches:
+            faces[name] = max(score, faces.get(name, score))
         return max(faces.items(), key=lambda x: x[1])[0]  # fancy argmax
 
 
+# === WORKER PROCESS (see face_service.py) ===
+_worker_rec = None
+
+
+def init_worker():
+    """Process pool initializer, loads the models once per worker."""
+    global _worker_rec
+    start = time.perf_counter()
+    _worker_rec = Recognizer()
+    _worker_rec.load_seconds = time.perf_counter() - start  # type: ignore
+
+
+def worker_ready() -> float:
+    """Warm-up task, returns how long the models took to load."""
+    return _worker_rec.load_seconds  # type: ignore
+
+
+def recognize_encoded(image_bytes: bytes) -> tuple[str, float]:
+    """Decode and recognize an image, returns (name, inference seconds)."""
+    start = time.perf_counter()
+    image = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("Image could not be decoded")
+    name = _worker_rec.recognize(image)  # type: ignore
+    return name, time.perf_counter() - start
+
+
 if __name__ == "__main__":
     rec = Recognizer()
     img = cv2.imread("test_faceid2.png")
@@ -0,0 +1,176 @@
+"""
+MQTT subscription running on the webserver IOLoop (conf.LIVE_MQTT), so live
+readings go broker -> webserver -> websocket without the dataprocessor hop.
+
+paho's network loop is driven by asyncio: its socket is registered with
+add_reader/add_writer and loop_misc() (keepalive, reconnect) runs every
+second. Blocking (re)connects run in an executor thread.
+"""
+
+import asyncio
+import time
+from datetime import datetime, timezone
+
+import paho.mqtt.client as mqtt
+
+import config as conf
+from logger import log
+from payload_parser import parse_payload
+from validator import VALIDATOR
+
+
+class LiveMqtt:
+    """
+    Subscribes to conf.MQTT_TOPIC and calls `on_payload(record)` on the
+    IOLoop with every valid reading (record normalised by VALIDATOR, the
+    same validation as the dataprocessor). While not subscribed readings are
+    missed, `on_gap(start, end)` is called with that time range once the
+    subscription is back.
+    """
+
+    def __init__(self, on_payload, on_gap=None, reconnect_max_delay=300):
+        self.on_payload = on_payload
+        self.on_gap = on_gap
+        self.reconnect_max_delay = reconnect_max_delay
+        self._down_since = None  # not subscribed since (UNIX time)
+        self.loop = None
+        self._misc_task = None
+        self._stopping = False
+
+        self.received = 0
+        self.invalid = 0
+        self.latency_count = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.latency_last = None
+
+        client = mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2)  # type: ignore
+        client.username_pw_set(conf.BROKER_UNAME, password=conf.BROKER_PASSWD)
+        client.on_connect = self._on_connect
+        client.on_disconnect = self._on_disconnect
+        client.on_message = self._on_message
+        client.on_socket_open = self._on_socket_open
+        client.on_socket_close = self._on_socket_close
+        client.on_socket_register_write = self._on_socket_register_write
+        client.on_socket_unregister_write = self._on_socket_unregister_write
+        self.client = client
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        self._down_since = time.time()
+        await self._connect()
+        self._misc_task = asyncio.create_task(self._misc_loop())
+
+    def stop(self):
+        self._stopping = True
+        if self._misc_task:
+            self._misc_task.cancel()
+        self.client.disconnect()
+
+    # === CONNECTION ===
+    async def _connect(self):
+        delay = 1
+        while not self._stopping:
+            try:
+                await self.loop.run_in_executor(  # type: ignore
+                    None,
+                    self.client.connect,
+                    conf.BROKER_IP,
+                    conf.BROKER_PORT,
+                    60,
+                )
+                return
+            except OSError as e:
+                log(
+                    f"Live MQTT connect failed ({e}), retry in {delay}s",
+                    level="ERROR",
+                    category="MQTT",
+                )
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.reconnect_max_delay)
+
+    async def _misc_loop(self):
+        while True:
+            if self.client.loop_misc() == mqtt.MQTT_ERR_NO_CONN:
+                await self._connect()
+            await asyncio.sleep(1)
+
+    # socket callbacks may come from the executor thread (connect), fds are
+    # taken right away because the socket is closed before a deferred call
+    def _on_loop(self, fn, *args):
+        try:
+            on_loop = asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            fn(*args)
+        else:
+            self.loop.call_soon_threadsafe(fn, *args)  # type: ignore
+
+    def _on_socket_open(self, client, userdata, sock):
+        self._on_loop(self.loop.add_reader, sock.fileno(), client.loop_read)  # type: ignore
+
+    def _on_socket_close(self, client, userdata, sock):
+        self._on_loop(self.loop.remove_reader, sock.fileno())  # type: ignore
+
+    def _on_socket_register_write(self, client, userdata, sock):
+        self._on_loop(self.loop.add_writer, sock.fileno(), client.loop_write)  # type: ignore
+
+    def _on_socket_unregister_write(self, client, userdata, sock):
+        self._on_loop(self.loop.remove_writer, sock.fileno())  # type: ignore
+
+    # === MQTT CALLBACKS ===
+    def _on_connect(self, client, userdata, flags, rc, properties):
+        if rc == 0:
+            client.subscribe(conf.MQTT_TOPIC)
+            log("Live MQTT subscribed.", category="MQTT")
+            if self._down_since is not None and self.on_gap:
+                self.on_gap(self._down_since, time.time())
+            self._down_since = None
+        else:
+            log(f"Live MQTT connect refused: {rc}", level="ERROR", category="MQTT")
+
+    def _on_disconnect(self, client, userdata, flags, rc, properties):
+        if self._down_since is None:
+            self._down_since = time.time()
+
+    def _on_message(self, client, userdata, msg):
+        if msg.topic not in conf.VALID_TOPICS:
+            return
+        self.received += 1
+        try:
+            record = VALIDATOR.validate(parse_payload(msg.payload))
+        except ValueError as e:
+            self.invalid += 1
+            log(f"Live MQTT reading skipped: {e}", level="WARNING", category="MQTT")
+            return
+
+        self._track_latency(record["timestamp"])
+        self.on_payload(record)
+
+    def _track_latency(self, timestamp: str):
+        """Sensor timestamp (UTC) -> webserver, depends on the sensor clock."""
+        try:
+            sent = datetime.fromisoformat(timestamp).replace(tzinfo=timezone.utc)
+            latency = time.time() - sent.timestamp()
+        except (ValueError, OverflowError):
+            return  # validated already, never raise out of the paho callback
+        self.latency_count += 1
+        self.latency_last = latency
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+
+    def stats(self) -> dict:
+        tracked = self.latency_count
+        return {
+            "connected": self.client.is_connected(),
+            "received": self.received,
+            "invalid": self.invalid,
+            "latency_last_ms": (
+                round(1000 * self.latency_last, 1) if self.latency_last else None
+            ),
+            "latency_avg_ms": (
+                round(1000 * self.latency_total / tracked, 1) if tracked else None
+            ),
+            "latency_max_ms": round(1000 * self.latency_max, 1) if tracked else None,
+        }
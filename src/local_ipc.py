@@ -0,0 +1,222 @@
+"""
+Local channel for new readings, dataprocessor -> webserver on the same
+machine, instead of an HTTPS request through the public URL per reading.
+
+Unix domain stream socket (conf.IPC_SOCKET_PATH), every reading is one line
+of JSON. The publisher sends everything that queued up meanwhile with one
+write, so bursts go out batched. Readings dropped by the publisher (queue
+full) are reported with a {"gap": [start, end]} frame, the UNIX times of
+the first and last dropped reading.
+"""
+
+import json
+import math
+import queue
+import socket
+import threading
+import time
+from datetime import datetime, timezone
+
+from tornado.iostream import StreamClosedError
+from tornado.netutil import bind_unix_socket
+from tornado.tcpserver import TCPServer
+
+import config as conf
+from logger import log
+
+_STOP = object()  # sentinel for the publisher thread
+
+
+def _reading_time(payload: dict) -> float:
+    """UNIX time of the reading (timestamp is UTC), now if it has none."""
+    try:
+        sent = datetime.fromisoformat(payload["timestamp"])
+        return sent.replace(tzinfo=timezone.utc).timestamp()
+    except (KeyError, TypeError, ValueError, OverflowError):
+        return time.time()
+
+
+def _gap_range(frame) -> tuple | None:
+    """(start, end) of a {"gap": [start, end]} frame, None if it is malformed."""
+    gap = frame["gap"]
+    if not isinstance(gap, list) or len(gap) != 2:
+        return None
+    for value in gap:
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return None
+        if not math.isfinite(value):
+            return None
+    start, end = gap
+    return (start, end) if start <= end else None
+
+
+class IpcPublisher:
+    """
+    Sends readings to the webserver from a background thread.
+
+    While the socket is not available (webserver not running, older
+    webserver), the readings go to `fallback(payload)` and connecting is
+    retried every `reconnect_delay` seconds.
+    """
+
+    def __init__(
+        self,
+        fallback,
+        path=conf.IPC_SOCKET_PATH,
+        queue_max=conf.IPC_QUEUE_MAX,
+        reconnect_delay=conf.IPC_RECONNECT_DELAY,
+        batch_max=conf.IPC_BATCH_MAX,
+    ):
+        self.fallback = fallback
+        self.path = path
+        self.reconnect_delay = reconnect_delay
+        self.batch_max = batch_max
+        self._queue = queue.Queue(maxsize=queue_max)
+        self._sock = None
+        self._next_connect = 0.0
+
+        self.sent = 0
+        self.fallbacks = 0
+        self.dropped = 0
+        self._gap = None  # [first, last] dropped reading time not reported yet
+        self._gap_lock = threading.Lock()
+
+        self._thread = threading.Thread(target=self._run, name="ipc", daemon=True)
+        self._thread.start()
+
+    def publish(self, payload: dict) -> bool:
+        """Queue reading for the webserver, never blocks."""
+        try:
+            self._queue.put_nowait(payload)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            sent = _reading_time(payload)
+            self._report_later([sent, sent])
+            return False
+
+    def close(self):
+        """Send what is queued, then close the socket."""
+        self._queue.put(_STOP)
+        self._thread.join()
+        if self._sock:
+            self._sock.close()
+            self._sock = None
+        log(
+            f"IPC closed: sent={self.sent} fallbacks={self.fallbacks} "
+            f"dropped={self.dropped}",
+            category="IPC",
+        )
+
+    # === PUBLISHER THREAD ===
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while batch[-1] is not _STOP and len(batch) < self.batch_max:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = batch[-1] is _STOP
+            if stop:
+                batch.pop()
+            with self._gap_lock:
+                gap, self._gap = self._gap, None
+            if gap:
+                batch.append({"gap": gap})
+            if batch:
+                self._send(batch)
+            if stop:
+                return
+
+    def _send(self, batch: list):
+        data = b"".join(
+            json.dumps(payload, separators=(",", ":")).encode() + b"\n"
+            for payload in batch
+        )
+        if self._connect():
+            try:
+                self._sock.sendall(data)  # type: ignore
+                self.sent += len(batch)
+                return
+            except OSError as e:
+                log(f"IPC send failed: {e}", level="WARNING", category="IPC")
+                self._sock.close()  # type: ignore
+                self._sock = None
+                self._next_connect = time.monotonic() + self.reconnect_delay
+
+        # a partly sent batch may be delivered twice, that is harmless here
+        for payload in batch:
+            if "gap" in payload:
+                self._report_later(payload["gap"])
+            else:
+                self.fallbacks += 1
+                self.fallback(payload)
+
+    def _report_later(self, gap: list):
+        """Merge `gap` into the one sent with the next batch."""
+        with self._gap_lock:
+            if self._gap is None:
+                self._gap = gap
+            else:
+                self._gap = [min(gap[0], self._gap[0]), max(gap[1], self._gap[1])]
+
+    def _connect(self) -> bool:
+        if self._sock:
+            return True
+        if time.monotonic() < self._next_connect:
+            return False
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.path)
+        except OSError as e:
+            sock.close()
+            self._next_connect = time.monotonic() + self.reconnect_delay
+            log(f"IPC socket not available: {e}", level="WARNING", category="IPC")
+            return False
+
+        self._sock = sock
+        log(f"IPC connected to {self.path}.", category="IPC")
+        return True
+
+
+class IpcServer(TCPServer):
+    """
+    Webserver side, calls `on_payload(payload)` on the IOLoop per reading and
+    `on_gap(start, end)` for readings dropped by the publisher.
+    """
+
+    def __init__(self, on_payload, on_gap=None, max_line=conf.IPC_MAX_LINE):
+        super().__init__()
+        self.on_payload = on_payload
+        self.on_gap = on_gap
+        self.max_line = max_line
+
+    def listen_unix(self, path=conf.IPC_SOCKET_PATH):
+        self.add_socket(bind_unix_socket(path))
+
+    async def handle_stream(self, stream, address):
+        try:
+            while True:
+                line = await stream.read_until(b"\n", max_bytes=self.max_line)
+                try:
+                    payload = json.loads(line)
+                except ValueError as e:
+                    log(f"Invalid IPC frame: {e}", level="WARNING", category="IPC")
+                    continue
+                if isinstance(payload, dict) and "gap" in payload:
+                    gap = _gap_range(payload)
+                    if gap is None:
+                        log(
+                            f"Invalid IPC gap frame: {line[:200]!r}",
+                            level="WARNING",
+                            category="IPC",
+                        )
+                    elif self.on_gap:
+                        self.on_gap(*gap)
+                    continue
+                self.on_payload(payload)
+        except StreamClosedError:
+            pass  # dataprocessor went away, it reconnects
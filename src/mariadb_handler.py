@@ -1,16 +1,64 @@
-from mysql.connector import Error
+from mysql.connector import Error, InterfaceError, OperationalError, errorcode
 import mysql.connector
+import queue
+import threading
+import time
 import config as conf
 from logger import log
+import rollups
+
+# transaction aborted by the server, retrying it may succeed
+_TRANSIENT = (errorcode.ER_LOCK_DEADLOCK, errorcode.ER_LOCK_WAIT_TIMEOUT)
+
+INSERT_SQL = (
+    "INSERT INTO prod (team, temperature, humidity, lightness, time) "
+    "VALUES (%s, %s, %s, %s, %s)"
+)
+
+_STOP = object()  # sentinel for the writer thread
 
 
 class mariaDB_handler:
-    def __init__(self):
+    """
+    Buffered writer for the `prod` table (and its `prod_rollup` aggregates).
+
+    Records are put to a bounded queue and a background thread writes them
+    with one `executemany` + one commit per batch. A batch is flushed when it
+    reaches DB_BATCH_SIZE records or when its oldest record is older than
+    DB_BATCH_MAX_AGE seconds, the rollups are updated in the same transaction,
+    so both are written or retried together (deadlocks and lock wait timeouts
+    are retried). Only a missing prod_rollup table (migration not applied
+    yet) turns the rollups off and the readings are still stored. A batch
+    the server rejects (bad row) is written row by row, only the rejected
+    rows are dropped.
+    When the queue is full, producers block (backpressure) for up to
+    DB_QUEUE_PUT_TIMEOUT seconds.
+    """
+
+    def __init__(
+        self,
+        batch_size=conf.DB_BATCH_SIZE,
+        max_age=conf.DB_BATCH_MAX_AGE,
+        queue_max=conf.DB_QUEUE_MAX,
+    ):
         self.MARIADB_CONNECTION = mysql.connector.connect(**conf.MYSQL_CONFIG)
         self.CURSOR = self.MARIADB_CONNECTION.cursor()
+        self.rollups = True  # off when the prod_rollup table is missing
+
+        self.batch_size = batch_size
+        self.max_age = max_age
+        self._queue = queue.Queue(maxsize=queue_max)
+        self._writer = threading.Thread(
+            target=self._writer_loop, name="mariadb-writer", daemon=True
+        )
+        self._writer.start()
 
     def close(self):
-        """Safely close cursor and database connection."""
+        """Flush buffered records, then safely close cursor and database connection."""
+        if self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._writer.join()
+
         try:
             if self.CURSOR:
                 self.CURSOR.close()
@@ -23,34 +71,145 @@ class mariaDB_handler:
             log(f"Error closing MariaDB connection: {e}", level="ERROR", category="DB")
 
     @staticmethod
-    def __value_to_sql(inp: dict):
-        """Return parameterized SQL and params tuple."""
-        sql = (
-            "INSERT INTO prod (team, temperature, humidity, lightness, time) "
-            "VALUES (%s, %s, %s, %s, %s)"
-        )
-        params = (
+    def __value_to_params(inp: dict) -> tuple:
+        """Return params tuple for INSERT_SQL (inp is normalised by the validator)."""
+        return (
             inp["team_name"],
-            float(inp["temperature"]),
-            float(inp["humidity"]) if inp.get("humidity") is not None else None,
-            float(inp["illumination"]) if inp.get("illumination") is not None else None,
+            inp["temperature"],
+            inp["humidity"],
+            inp["illumination"],
             inp["timestamp"],
         )
-        return sql, params
 
     def insert_to_mariadb(self, data: dict) -> bool:
-        """Insert a validated record into MariaDB."""
+        """
+        Queue a validated record for insertion into MariaDB.
+        Blocks while the queue is full, returns False if it stays full.
+        """
         try:
-            sql, params = self.__value_to_sql(data)
-            self.CURSOR.execute(sql, params)  # type: ignore
-            self.MARIADB_CONNECTION.commit()  # type: ignore
-
-            log("Record inserted successfully to MariaDB.", category="DB")
+            params = self.__value_to_params(data)
+            self._queue.put(params, timeout=conf.DB_QUEUE_PUT_TIMEOUT)
             return True
+        except queue.Full:
+            log(
+                "Write queue is full, record dropped.",
+                level="ERROR",
+                category="DB",
+            )
+            return False
+
+    def pending(self) -> int:
+        """Number of records waiting in the queue."""
+        return self._queue.qsize()
+
+    # === WRITER THREAD ===
+    def _writer_loop(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None  # batch is too old
 
+            if item is _STOP:
+                self._flush(batch)
+                return
+
+            if item is not None:
+                if not batch:
+                    deadline = time.monotonic() + self.max_age
+                batch.append(item)
+
+            if batch and (item is None or len(batch) >= self.batch_size):
+                self._flush(batch)
+                batch = []
+                deadline = None
+
+    def _flush(self, batch: list):
+        """Write batch + rollups in one transaction, retry once after reconnect."""
+        if not batch:
+            return
+
+        for attempt in range(2):
+            try:
+                self.CURSOR.executemany(INSERT_SQL, batch)  # type: ignore
+                self._commit(batch)
+                log(f"{len(batch)} records inserted to MariaDB.", category="DB")
+                return
+            except (OperationalError, InterfaceError) as e:
+                log(f"Database Error: {e}", level="ERROR", category="DB")
+                self._rollback()
+                if attempt == 0 and not self._reconnect():
+                    break
+            except Error as e:
+                self._rollback()
+                if e.errno in _TRANSIENT:
+                    log(f"Transaction aborted: {e}", level="WARNING", category="DB")
+                    continue
+                # rejected data (e.g. invalid date in strict mode), not the connection
+                log(f"Batch rejected: {e}", level="WARNING", category="DB")
+                self._flush_rows(batch)
+                return
+
+        log(f"{len(batch)} records were not inserted.", level="ERROR", category="DB")
+
+    def _flush_rows(self, batch: list):
+        """Insert row by row, drop the rows the server rejects."""
+        good = []
+        try:
+            for row in batch:
+                try:
+                    self.CURSOR.execute(INSERT_SQL, row)  # type: ignore
+                    good.append(row)
+                except (OperationalError, InterfaceError):
+                    raise
+                except Error as e:
+                    log(f"Record dropped {row}: {e}", level="ERROR", category="DB")
+            if good:
+                self._commit(good)
+            log(
+                f"{len(good)} of {len(batch)} records inserted to MariaDB.",
+                category="DB",
+            )
         except Error as e:
             log(f"Database Error: {e}", level="ERROR", category="DB")
-            # TODO call reconect function
+            self._rollback()
+            log(
+                f"{len(batch)} records were not inserted.", level="ERROR", category="DB"
+            )
 
-            # tmp
+    def _commit(self, rows: list):
+        """Update the rollups with the inserted rows and commit."""
+        if self.rollups:
+            try:
+                self.CURSOR.execute(*rollups.batch_upsert(rows))  # type: ignore
+            except Error as e:
+                if e.errno != errorcode.ER_NO_SUCH_TABLE:
+                    raise  # rolled back and retried with the insert
+                # only the failed statement is undone, the insert stays
+                self.rollups = False
+                log(
+                    "Table prod_rollup is missing, rollups are off: apply "
+                    "sql/001_prod_rollup.sql and run `rollups.py backfill`.",
+                    level="ERROR",
+                    category="ROLLUP",
+                )
+        self.MARIADB_CONNECTION.commit()  # type: ignore
+
+    def _rollback(self):
+        try:
+            self.MARIADB_CONNECTION.rollback()  # type: ignore
+        except Error:
+            pass  # connection is gone, reconnect below
+
+    def _reconnect(self) -> bool:
+        try:
+            self.MARIADB_CONNECTION.ping(reconnect=True, attempts=3, delay=1)  # type: ignore
+            self.CURSOR = self.MARIADB_CONNECTION.cursor()  # type: ignore
+            log("Reconnected to MariaDB.", category="DB")
+            return True
+        except Error as e:
+            log(f"Reconnect to MariaDB failed: {e}", level="ERROR", category="DB")
             return False
@@ -0,0 +1,32 @@
+import ast
+import json
+
+
+def parse_payload(raw: bytes | str) -> dict:
+    """
+    Parse MQTT payload into dict.
+
+    Strict JSON is tried first (that is what the Pico firmware sends), the
+    raw bytes are passed to json.loads as they are (it detects the encoding
+    and decodes them itself, the caller does not need to).
+    Python literal syntax ({'key': 'value', 'x': None}) is accepted only as
+    a fallback, because ast.literal_eval is much slower.
+
+    Raises ValueError if payload is neither, or if it is not a dict.
+    """
+    try:
+        payload = json.loads(raw)  # accepts bytes, detects utf-8/16/32
+    except ValueError:  # JSONDecodeError and UnicodeDecodeError
+        payload = _parse_literal(raw)
+
+    if not isinstance(payload, dict):
+        raise ValueError(f"Payload is not an object: {type(payload).__name__}")
+    return payload
+
+
+def _parse_literal(raw: bytes | str):
+    try:
+        text = raw.decode("utf-8") if isinstance(raw, (bytes, bytearray)) else raw
+        return ast.literal_eval(text)
+    except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError) as e:
+        raise ValueError(f"Payload is neither JSON nor Python literal: {e}") from e
@@ -0,0 +1,160 @@
+import queue
+import threading
+import time
+import config as conf
+from logger import log
+
+_STOP = object()  # sentinel for worker threads
+
+
+class Stage:
+    """
+    One step of the processing pipeline.
+
+    Items are put to a bounded queue and handled by a pool of worker threads.
+    Whatever the handler returns (unless it is None or False) is submitted
+    to every stage in `next_stages`.
+    """
+
+    def __init__(self, name, handler, workers=1, queue_max=1000, next_stages=()):
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.next_stages = list(next_stages)
+        self._queue = queue.Queue(maxsize=queue_max)
+        self._threads = []
+
+        self._lock = threading.Lock()
+        self.processed = 0
+        self.errors = 0
+        self.dropped = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def start(self):
+        for i in range(self.workers):
+            t = threading.Thread(
+                target=self._work, name=f"stage-{self.name}-{i}", daemon=True
+            )
+            t.start()
+            self._threads.append(t)
+
+    def stop(self):
+        """Let the workers finish everything already queued, then join them."""
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        for t in self._threads:
+            t.join()
+        self._threads = []
+
+    def submit(self, item, block=True, timeout=conf.PIPELINE_PUT_TIMEOUT) -> bool:
+        try:
+            self._queue.put(item, block=block, timeout=timeout)
+            return True
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            log(
+                f"Stage '{self.name}' queue is full, item dropped.",
+                level="WARNING",
+                category="PIPELINE",
+            )
+            return False
+
+    def stats(self) -> dict:
+        with self._lock:
+            done = self.processed + self.errors
+            return {
+                "depth": self._queue.qsize(),
+                "processed": self.processed,
+                "errors": self.errors,
+                "dropped": self.dropped,
+                "latency_avg_ms": (
+                    round(1000 * self.latency_total / done, 3) if done else 0.0
+                ),
+                "latency_max_ms": round(1000 * self.latency_max, 3),
+            }
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+
+            start = time.perf_counter()
+            try:
+                result = self.handler(item)
+                failed = False
+            except Exception as e:
+                log(
+                    f"Stage '{self.name}' failed: {e}",
+                    level="ERROR",
+                    category="PIPELINE",
+                )
+                result, failed = None, True
+            elapsed = time.perf_counter() - start
+
+            with self._lock:
+                if failed:
+                    self.errors += 1
+                else:
+                    self.processed += 1
+                self.latency_total += elapsed
+                self.latency_max = max(self.latency_max, elapsed)
+
+            if result is None or result is False:
+                continue
+            for stage in self.next_stages:
+                stage.submit(result)
+
+
+def make_stage(name, handler, next_stages=()) -> Stage:
+    """Stage with workers and queue size taken from conf.PIPELINE_STAGES."""
+    workers, queue_max = conf.PIPELINE_STAGES[name]
+    return Stage(name, handler, workers, queue_max, next_stages)
+
+
+class Pipeline:
+    """Set of stages fed through the first one (head)."""
+
+    def __init__(self, stages: list[Stage]):
+        self.stages = stages  # in topological order, head first
+        self.head = stages[0]
+        self._reporter = None
+        self._stop_event = threading.Event()
+
+    def start(self, stats_interval=conf.PIPELINE_STATS_INTERVAL):
+        for stage in self.stages:
+            stage.start()
+        if stats_interval:
+            self._reporter = threading.Thread(
+                target=self._report, args=(stats_interval,), daemon=True
+            )
+            self._reporter.start()
+
+    def stop(self):
+        """Drain stages one by one, upstream first."""
+        self._stop_event.set()
+        for stage in self.stages:
+            stage.stop()
+        self.log_stats()
+
+    def submit(self, item) -> bool:
+        """Non blocking put to the head stage (safe to call from MQTT thread)."""
+        return self.head.submit(item, block=False)
+
+    def stats(self) -> dict:
+        return {stage.name: stage.stats() for stage in self.stages}
+
+    def log_stats(self):
+        for name, s in self.stats().items():
+            log(
+                f"{name}: depth={s['depth']} processed={s['processed']} "
+                f"errors={s['errors']} dropped={s['dropped']} "
+                f"avg={s['latency_avg_ms']}ms max={s['latency_max_ms']}ms",
+                category="PIPELINE",
+            )
+
+    def _report(self, interval):
+        while not self._stop_event.wait(interval):
+            self.log_stats()
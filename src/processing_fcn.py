@@ -1,59 +1,87 @@
 import requests
-import ast  # json module is not enough
 
 
 import aws_handler as aws
 import config as conf
+from local_ipc import IpcPublisher
 from mariadb_handler import mariaDB_handler
+from payload_parser import parse_payload
+from pipeline import Pipeline, make_stage
+from validator import VALIDATOR
 from logger import log
 
 
 class PROCESSOR:  # :}
     def __init__(self) -> None:
         self.mariaDB = mariaDB_handler()
+        # with LIVE_MQTT the webserver reads MQTT itself
+        self.ipc = None if conf.LIVE_MQTT else IpcPublisher(fallback=self.notify_http)
+
+        # parse/validate -> (DB sink, AWS sink, websocket-notify sink)
+        # every sink has its own queue and workers, so a slow one
+        # does not hold back the others nor the MQTT loop
+        sinks = [
+            make_stage("db", self.mariaDB.insert_to_mariadb),
+            make_stage("aws", self.aws_sink),
+        ]
+        if self.ipc:
+            sinks.append(make_stage("notify", self.notify_local_server))
+        parse = make_stage("parse", self.parse_and_validate, sinks)
+
+        self.pipeline = Pipeline([parse, *sinks])
+        self.pipeline.start()
+        aws.RETRY_SCHEDULER.start()
 
     def terminarot(self):
         """Hasta La vista, baby.
-        Close all things that need to be closed."""
+        Close all things that need to be closed.
+        Queued messages and buffered DB records are flushed first."""
+        self.pipeline.stop()
+        if self.ipc:
+            self.ipc.close()
+        aws.RETRY_SCHEDULER.stop()
+        aws.UPLOADER.close()
         self.mariaDB.close()
 
-    def process_data(self, msg: str):
+    def process_data(self, msg: bytes | str) -> bool:
         """
         MAIN PROCESSING FUNCTION
+        Hand the message over to the pipeline, returns immediately.
 
         message structure:
         {'team_name': string, 'timestamp': string, 'temperature': float, 'humidity': float, 'illumination': float}
 
         e.g.: {'team_name': 'white', 'timestamp': '2020-03-24T15:26:05.336974', 'temperature': 25.72, 'humidity': 64.5, 'illumination': 1043}
         """
+        return self.pipeline.submit(msg)
+
+    def parse_and_validate(self, msg: bytes | str):
+        """First pipeline stage, returns payload dict or None."""
         try:
-            payload: dict = ast.literal_eval(msg)  # json.loads() is too weak
+            payload = parse_payload(msg)  # JSON, python literal as fallback
         except ValueError as e:
-            log(f"Mqtt message is not json, msg: {msg}\n{e}", level="ERROR")
-            return False
+            log(f"Mqtt message is not json, msg: {msg!r}\n{e}", level="ERROR")
+            return None
 
-        if not self.validate_input(payload):
+        try:
+            return VALIDATOR.validate(payload)  # normalised record
+        except ValueError as e:
             log(
-                "Data validation failed, skipping.",
+                f"Data validation failed, skipping. {e}",
                 level="WARNING",
                 category="VALIDATOR",
             )
-            return False
-
-        self.mariaDB.insert_to_mariadb(payload)  # send to our database
+            return None
 
+    @staticmethod
+    def aws_sink(payload: dict):
         if payload["team_name"] == "blue":
             aws.send_to_aws(payload)
 
-        self.notify_local_server(payload)
-
-        log("Waiting for next message")
-        return True
-
     @staticmethod
     def validate_input(inp: dict) -> bool:
         """
-        Validates input data.
+        Validates input data (schema is conf.PAYLOAD_SCHEMA).
         Suported format:
         {
             "team_name": string,
@@ -63,59 +91,19 @@ class PROCESSOR:  # :}
             optional: "illumination": float,
         }
         """
-        required = {"team_name", "timestamp", "temperature"}
-        missing = required - inp.keys()
-        if missing:
-            log(
-                f"Missing required keys: {missing}",
-                level="WARNING",
-                category="VALIDATOR",
-            )
-            return False
-
-        if inp["team_name"] not in conf.VALID_TEAMS:
-            log(
-                f"Invalid team name: {inp['team_name']}",
-                level="WARNING",
-                category="VALIDATOR",
-            )
-            return False
-
-        # timestamp format check (simple ISO8601 validation)
-        if not conf.TIMESTAMP_REGEX.match(inp["timestamp"]):
-            log(
-                f"Invalid timestamp format: {inp['timestamp']}",
-                level="WARNING",
-                category="VALIDATOR",
-            )
-            return False
-
         try:
-            float(inp["temperature"])
-        except (ValueError, TypeError):
-            log(
-                f"Invalid temperature value: {inp['temperature']}",
-                level="WARNING",
-                category="VALIDATOR",
-            )
+            VALIDATOR.validate(inp)
+            return True
+        except ValueError as e:
+            log(str(e), level="WARNING", category="VALIDATOR")
             return False
 
-        for key in ["humidity", "illumination"]:
-            if key in inp and inp[key] is not None:
-                try:
-                    float(inp[key])
-                except (ValueError, TypeError):
-                    log(
-                        f"Invalid {key} value: {inp[key]}",
-                        level="WARNING",
-                        category="VALIDATOR",
-                    )
-                    return False
-
-        return True
-
     def notify_local_server(self, payload):
-        """NOTIFY LOCAL TORNADO SERVER"""
+        """NOTIFY LOCAL TORNADO SERVER (over local socket, HTTP as fallback)"""
+        self.ipc.publish(payload)
+
+    @staticmethod
+    def notify_http(payload):
         try:
             response = requests.post(conf.TORNADO_NOTIFY_URL, json=payload, timeout=3)
             if response.status_code == 200:
@@ -139,3 +127,4 @@ if __name__ == "__main__":  # for testing
 
     processor = PROCESSOR()
     processor.process_data(val)
+    processor.terminarot()
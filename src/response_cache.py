@@ -0,0 +1,77 @@
+import hashlib
+import time
+from collections import OrderedDict, namedtuple
+
+import config as conf
+
+CachedResponse = namedtuple("CachedResponse", "body etag modified versions")
+
+
+class ResponseCache:
+    """
+    Shared LRU cache of encoded /api/history responses (rollup queries only).
+
+    The key holds the bucket boundaries, so a window moving into a new bucket
+    is a new key. An entry stays valid until a new reading of one of its
+    teams arrives (touch(team)). Responses of queries started within
+    `settle` seconds after such a reading are not stored: the dataprocessor
+    may not have committed the reading to the rollups yet. IOLoop thread only.
+    """
+
+    def __init__(
+        self, max_entries=conf.HISTORY_CACHE_SIZE, settle=conf.HISTORY_CACHE_SETTLE
+    ):
+        self.max_entries = max_entries
+        self.settle = settle
+        self._entries = OrderedDict()  # key: CachedResponse
+        self._versions = {}  # team: (version, time of the last reading)
+
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.stored = 0
+
+    def touch(self, team):
+        """A new reading of `team` landed, its cached responses are stale."""
+        version, _ = self._versions.get(team, (0, 0.0))
+        self._versions[team] = (version + 1, time.time())
+
+    def versions(self, teams) -> tuple:
+        """Snapshot to pass to put(), take it before running the query."""
+        return tuple(self._versions.get(team, (0, 0.0))[0] for team in teams)
+
+    def get(self, key, teams):
+        entry = self._entries.get(key)
+        if entry is None or entry.versions != self.versions(teams):
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key, teams, versions, started: float, body: bytes) -> CachedResponse:
+        """`versions` and `started` (time.time()) are taken before the query."""
+        now = time.time()
+        entry = CachedResponse(body, hashlib.sha1(body).hexdigest(), int(now), versions)
+        last_reading = max(
+            (self._versions.get(team, (0, 0.0))[1] for team in teams), default=0.0
+        )
+        # readings after `started` changed the versions, get() never serves it
+        if started - last_reading >= self.settle:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self.stored += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,  # = DB queries saved
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "not_modified": self.not_modified,
+            "stored": self.stored,
+        }
@@ -0,0 +1,154 @@
+import json
+import os
+import threading
+from logger import log
+
+
+class RetryJournal:
+    """
+    Append-only persistent queue (one JSON record per line).
+
+    directory/
+    ├── 00000001.log    segments, the last one is the tail we append to
+    ├── 00000002.log
+    └── checkpoint      {"segment": 1, "offset": 123}, first unprocessed byte
+
+    - append() is O(1), it writes one line at the end of the tail segment.
+    - read() streams pending records from the checkpoint on, together with
+      their position; commit(position) moves the checkpoint behind them.
+    - Segments fully behind the checkpoint are deleted (compaction), the tail
+      is rolled over to a new segment once it grows over `segment_bytes`.
+    """
+
+    def __init__(self, directory: str, segment_bytes=1024 * 1024, fsync=False):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        self._checkpoint_file = os.path.join(directory, "checkpoint")
+        self._checkpoint = self._load_checkpoint()
+
+        segments = self._segments()
+        self._tail = max(segments) if segments else self._checkpoint[0]
+        self._tail_file = open(self._segment_path(self._tail), "ab")
+
+    # === WRITING ===
+    def append(self, record):
+        line = json.dumps(record, separators=(",", ":")).encode() + b"\n"
+        with self._lock:
+            if self._tail_file.tell() >= self.segment_bytes:
+                self._roll_over()
+            self._tail_file.write(line)
+            self._tail_file.flush()
+            if self.fsync:
+                os.fsync(self._tail_file.fileno())
+
+    def _roll_over(self):
+        self._tail_file.close()
+        self._tail += 1
+        self._tail_file = open(self._segment_path(self._tail), "ab")
+
+    def close(self):
+        with self._lock:
+            self._tail_file.close()
+
+    # === READING ===
+    def read(self):
+        """Yield (position, record) of pending records, oldest first."""
+        segment, offset = self._checkpoint
+        while segment <= self._tail:
+            path = self._segment_path(segment)
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    f.seek(offset)
+                    for line in iter(f.readline, b""):
+                        if not line.endswith(b"\n"):
+                            return  # half written by append(), read it next time
+                        offset += len(line)
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            log(
+                                f"Corrupted record in {path}, skipping.",
+                                level="ERROR",
+                                category="JOURNAL",
+                            )
+                            continue
+                        yield (segment, offset), record
+            segment, offset = segment + 1, 0
+
+    def peek(self):
+        """Oldest pending record or None."""
+        for _, record in self.read():
+            return record
+        return None
+
+    def empty(self) -> bool:
+        with self._lock:
+            segment, offset = self._checkpoint
+            return segment == self._tail and offset >= self._tail_file.tell()
+
+    def pending_bytes(self) -> int:
+        segment, offset = self._checkpoint
+        total = -offset
+        for s in self._segments():
+            if s >= segment:
+                total += os.path.getsize(self._segment_path(s))
+        return max(total, 0)
+
+    # === CHECKPOINT + COMPACTION ===
+    def commit(self, position: tuple[int, int]):
+        """Mark everything up to `position` (from read()) as processed."""
+        segment, offset = position
+        with self._lock:
+            if segment < self._tail and offset >= os.path.getsize(
+                self._segment_path(segment)
+            ):
+                segment, offset = segment + 1, 0  # whole segment is done
+            self._checkpoint = (segment, offset)
+            self._save_checkpoint()
+
+        for s in self._segments():
+            if s < segment:
+                os.remove(self._segment_path(s))
+
+    def _load_checkpoint(self) -> tuple[int, int]:
+        try:
+            with open(self._checkpoint_file, "r") as f:
+                data = json.load(f)
+            return int(data["segment"]), int(data["offset"])
+        except FileNotFoundError:
+            segments = self._segments()
+            return (min(segments) if segments else 1), 0
+        except (ValueError, KeyError) as e:
+            log(
+                f"Corrupted checkpoint, replaying journal from start: {e}",
+                level="ERROR",
+                category="JOURNAL",
+            )
+            segments = self._segments()
+            return (min(segments) if segments else 1), 0
+
+    def _save_checkpoint(self):
+        tmp = self._checkpoint_file + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(
+                {"segment": self._checkpoint[0], "offset": self._checkpoint[1]}, f
+            )
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, self._checkpoint_file)  # atomic
+
+    # === HELPERS ===
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"{segment:08d}.log")
+
+    def _segments(self) -> list[int]:
+        return sorted(
+            int(name[:-4])
+            for name in os.listdir(self.directory)
+            if name.endswith(".log") and name[:-4].isdigit()
+        )
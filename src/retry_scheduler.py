@@ -0,0 +1,252 @@
+import random
+from itertools import islice
+import threading
+import time
+import config as conf
+from logger import log
+from retry_journal import RetryJournal
+
+# outcome of one upload attempt
+OK = "ok"
+RETRY = "retry"  # 5xx, timeout, connection error -> try again later
+FATAL = "fatal"  # request itself is wrong (4xx) -> retrying will not help
+
+
+class CircuitBreaker:
+    """
+    Per-endpoint circuit breaker with exponential backoff and jitter.
+
+    closed    -> requests go through, every RETRY outcome postpones the next
+                 retry by base_delay * 2^(failures - 1) (capped, jittered)
+    open      -> after `threshold` consecutive failures nothing is sent
+                 until the backoff expires
+    half_open -> a single probe request is let through, its outcome
+                 closes or re-opens the breaker
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(
+        self,
+        name,
+        threshold=conf.AWS_BREAKER_THRESHOLD,
+        base_delay=conf.AWS_BACKOFF_BASE,
+        max_delay=conf.AWS_BACKOFF_MAX,
+    ):
+        self.name = name
+        self.threshold = threshold
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened = 0  # how many times the breaker opened
+        self.next_attempt = 0.0
+
+    def allow(self) -> bool:
+        """May a request be sent now?"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() >= self.next_attempt:
+                self.state = self.HALF_OPEN
+                return True  # the probe
+            return False
+
+    def retry_due(self) -> bool:
+        with self._lock:
+            return time.monotonic() >= self.next_attempt
+
+    def record(self, outcome):
+        with self._lock:
+            if outcome != RETRY:  # endpoint answered, even 4xx means it is up
+                if self.state != self.CLOSED:
+                    log(f"Breaker '{self.name}' closed.", category="RETRY")
+                self.state = self.CLOSED
+                self.failures = 0
+                self.next_attempt = 0.0
+                return
+
+            self.failures += 1
+            delay = min(self.max_delay, self.base_delay * 2 ** (self.failures - 1))
+            self.next_attempt = time.monotonic() + random.uniform(delay / 2, delay)
+            if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+                if self.state != self.OPEN:
+                    self.opened += 1
+                    log(
+                        f"Breaker '{self.name}' opened for {delay:.0f}s "
+                        f"after {self.failures} failures.",
+                        level="WARNING",
+                        category="RETRY",
+                    )
+                self.state = self.OPEN
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "failures": self.failures,
+                "opened": self.opened,
+                "next_attempt_in_s": round(
+                    max(self.next_attempt - time.monotonic(), 0), 1
+                ),
+            }
+
+
+class TokenBucket:
+    """
+    Rate limiter for requests sent from several threads: `rate` tokens per
+    second, at most `burst` of them saved up. take() waits for its token,
+    so requests go out evenly spaced instead of in bursts.
+    """
+
+    def __init__(self, rate, burst=1.0):
+        self.rate = rate
+        self.burst = burst
+        self._lock = threading.Lock()
+        self._tokens = burst
+        self._last = time.monotonic()
+
+    def take(self, stop_event=None) -> bool:
+        """Wait for a token, False if `stop_event` was set meanwhile."""
+        if self.rate == float("inf"):
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._last) * self.rate
+            )
+            self._last = now
+            self._tokens -= 1  # reserved, a negative balance is waited off
+            wait = -self._tokens / self.rate
+        if wait <= 0:
+            return True
+        if stop_event is None:
+            time.sleep(wait)
+            return True
+        return not stop_event.wait(wait)
+
+
+class RetryScheduler:
+    """
+    Background thread draining failed-task journals, one per endpoint.
+
+    A journal is drained only when its breaker lets requests through and its
+    backoff expired, `batch` tasks per round, requests paced by a token
+    bucket to `rate` per second. The checkpoint moves behind the last task
+    of the round that got an answer, tasks before it that failed again are
+    appended to the journal once more: nothing is lost and answered tasks are
+    not sent again.
+
+    upload_many([(type, data), ...], pace, breaker) must return (outcomes,
+    requests made), outcome is OK / RETRY / FATAL; FATAL tasks are dropped.
+    pace() is called before every request, a request is not sent (RETRY) if
+    it returns False; requests go through the journal's breaker.
+    """
+
+    def __init__(
+        self,
+        queues: dict[str, tuple[RetryJournal, CircuitBreaker]],
+        upload_many,
+        rate=conf.AWS_RETRY_RATE,
+        batch=conf.AWS_RETRY_BATCH,
+        tick=conf.AWS_RETRY_TICK,
+        stats_interval=conf.AWS_RETRY_STATS_INTERVAL,
+    ):
+        self.queues = queues
+        self.upload_many = upload_many
+        self.rate = rate
+        self.batch = batch
+        self.tick = tick
+        self.stats_interval = stats_interval
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._buckets = {name: TokenBucket(rate) for name in queues}
+        self.counters = {
+            name: {"retried": 0, "retry_failures": 0, "dropped": 0} for name in queues
+        }
+
+    def start(self):
+        if self._thread:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="aws-retry", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self.log_stats()
+
+    def _run(self):
+        last_stats = time.monotonic()
+        while not self._stop_event.wait(self.tick):
+            for name in self.queues:
+                self.drain(name)
+            if time.monotonic() - last_stats >= self.stats_interval:
+                self.log_stats()
+                last_stats = time.monotonic()
+
+    def drain(self, name) -> int:
+        """One rate limited drain round of one journal, returns tasks done."""
+        journal, breaker = self.queues[name]
+        counters = self.counters[name]
+        if journal.empty() or not breaker.retry_due():
+            return 0
+
+        records = list(islice(journal.read(), self.batch))
+        tasks = [(record[0], record[1]) for _, record in records]
+        bucket = self._buckets[name]
+        outcomes, _ = self.upload_many(
+            tasks, lambda: bucket.take(self._stop_event), breaker
+        )
+
+        answered = [i for i, outcome in enumerate(outcomes) if outcome != RETRY]
+        if not answered:
+            counters["retry_failures"] += len(records)
+            return 0
+        last = answered[-1]
+
+        count = 0
+        for (_, record), outcome in zip(records[: last + 1], outcomes):
+            if outcome == RETRY:
+                counters["retry_failures"] += 1
+                journal.append(record)  # before the commit, a crash only duplicates
+            elif outcome == FATAL:
+                counters["dropped"] += 1
+                log(
+                    f"Dropping rejected task: {record[1]}",
+                    level="ERROR",
+                    category="RETRY",
+                )
+                count += 1
+            else:
+                counters["retried"] += 1
+                count += 1
+        counters["retry_failures"] += len(records) - last - 1
+        journal.commit(records[last][0])
+        return count
+
+    def stats(self) -> dict:
+        out = {}
+        for name, (journal, breaker) in self.queues.items():
+            oldest = journal.peek()
+            enqueued = oldest[2] if oldest and len(oldest) > 2 else None
+            out[name] = {
+                **breaker.stats(),
+                **self.counters[name],
+                "pending_bytes": journal.pending_bytes(),
+                "queue_age_s": round(time.time() - enqueued, 1) if enqueued else 0.0,
+            }
+        return out
+
+    def log_stats(self):
+        for name, s in self.stats().items():
+            log(
+                f"{name}: breaker={s['state']} age={s['queue_age_s']}s "
+                f"pending={s['pending_bytes']}B retried={s['retried']} "
+                f"failed={s['retry_failures']} dropped={s['dropped']}",
+                category="RETRY",
+            )
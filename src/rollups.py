@@ -0,0 +1,109 @@
+"""
+Pre-aggregated readings in the `prod_rollup` table (sql/001_prod_rollup.sql).
+
+Every bucket keeps sum, count, min and max of each metric, so it can be
+updated incrementally (the dataprocessor merges every inserted batch into
+it) and the average is still exact. Buckets are aligned to the UTC epoch
+with plain date arithmetic, independent of the DB session time zone.
+
+Rebuild from existing `prod` rows (stop the dataprocessor first):
+    python src/rollups.py backfill [--chunk-days 7]
+"""
+
+import argparse
+from datetime import timedelta
+
+import mysql.connector
+
+import config as conf
+from logger import log
+
+METRICS = ("temperature", "humidity", "lightness")
+
+_COLUMNS = ", ".join(f"{m}_sum, {m}_count, {m}_min, {m}_max" for m in METRICS)
+_AGGREGATES = ", ".join(
+    f"COALESCE(SUM(r.{m}), 0), COUNT(r.{m}), MIN(r.{m}), MAX(r.{m})" for m in METRICS
+)
+_MERGE = ", ".join(
+    f"{m}_sum = {m}_sum + VALUES({m}_sum), "
+    f"{m}_count = {m}_count + VALUES({m}_count), "
+    f"{m}_min = LEAST(COALESCE({m}_min, VALUES({m}_min)), "
+    f"COALESCE(VALUES({m}_min), {m}_min)), "
+    f"{m}_max = GREATEST(COALESCE({m}_max, VALUES({m}_max)), "
+    f"COALESCE(VALUES({m}_max), {m}_max))"
+    for m in METRICS
+)
+_BATCH_ROW = (
+    "SELECT %s AS team, %s AS temperature, %s AS humidity, %s AS lightness, "
+    "CAST(%s AS DATETIME(6)) AS time"
+)  # same params as mariadb_handler.INSERT_SQL
+
+
+def bucket_start(column: str, seconds: str) -> str:
+    """SQL expression flooring DATETIME `column` to `seconds` long UTC bucket."""
+    return (
+        f"DATE_ADD('1970-01-01', INTERVAL FLOOR(TIMESTAMPDIFF(SECOND, "
+        f"'1970-01-01', {column}) / {seconds}) * {seconds} SECOND)"
+    )
+
+
+def _upsert_sql(source: str, intervals=conf.ROLLUP_INTERVALS) -> str:
+    """Merge readings selected by `source` into all rollup intervals."""
+    interval_table = " UNION ALL ".join(f"SELECT {s} AS s" for s in intervals)
+    return (
+        f"INSERT INTO prod_rollup (bucket_seconds, bucket_start, team, {_COLUMNS}) "
+        f"SELECT i.s, {bucket_start('r.time', 'i.s')}, r.team, {_AGGREGATES} "
+        f"FROM ({source}) r CROSS JOIN ({interval_table}) i "
+        f"GROUP BY 1, 2, 3 "
+        f"ON DUPLICATE KEY UPDATE {_MERGE}"
+    )
+
+
+def batch_upsert(batch: list[tuple]) -> tuple[str, list]:
+    """
+    (sql, params) merging a batch of mariadb_handler.INSERT_SQL params into
+    the rollups with one statement. Run it in the transaction of the insert.
+    """
+    source = " UNION ALL ".join([_BATCH_ROW] * len(batch))
+    return _upsert_sql(source), [value for row in batch for value in row]
+
+
+def backfill(chunk_days=7):
+    """Rebuild prod_rollup from prod, one transaction per chunk of days."""
+    conn = mysql.connector.connect(**conf.MYSQL_CONFIG)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT MIN(time), MAX(time) FROM prod")
+        first, last = cursor.fetchone()
+        cursor.execute("DELETE FROM prod_rollup")
+        conn.commit()
+        if first is None:
+            log("Table prod is empty, nothing to backfill.", category="ROLLUP")
+            return
+
+        # chunks start at UTC midnight, so no bucket is split between two chunks
+        start = first.replace(hour=0, minute=0, second=0, microsecond=0)
+        sql = _upsert_sql(
+            "SELECT team, temperature, humidity, lightness, time FROM prod "
+            "WHERE time >= %s AND time < %s"
+        )
+        while start <= last:
+            end = start + timedelta(days=chunk_days)
+            cursor.execute(sql, (start, end))
+            conn.commit()
+            log(f"Rollups built up to {end}.", category="ROLLUP")
+            start = end
+    finally:
+        cursor.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the prod_rollup table.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    cmd = commands.add_parser("backfill", help="rebuild rollups from prod")
+    cmd.add_argument("--chunk-days", type=int, default=7)
+    args = parser.parse_args()
+
+    if args.command == "backfill":
+        backfill(args.chunk_days)
@@ -1,3 +1,4 @@
+import signal
 import time
 import paho.mqtt.client as mqtt
 import config as conf
@@ -27,10 +28,10 @@ def on_message(client, userdata, msg):
         if msg.topic not in conf.VALID_TOPICS:
             log(f"Invalid topic: {msg.topic}", category="MQTT")
             return
-        payload = msg.payload.decode("utf-8")  # type: ignore
-        log(f"MQTT received data: {payload}", category="MQTT")
+        log(f"MQTT received {len(msg.payload)} B on {msg.topic}", category="MQTT")
 
-        processor.process_data(payload)
+        # raw bytes, parsed in the pipeline without decode copy
+        processor.process_data(msg.payload)  # only queues, the pipeline does the rest
 
     except Exception as e:
         log(f"Error processing message: {e}", level="ERROR", category="MQTT")
@@ -50,6 +51,12 @@ def reconnect_mqtt(client, max_delay=300):
             delay = min(delay * 2, max_delay)
 
 
+def on_sigterm(signum, frame):
+    """systemctl stop/restart: leave the MQTT loop, terminarot() flushes."""
+    log("SIGTERM received, shutting down.")
+    raise SystemExit(0)
+
+
 # === MAIN SCRIPT ===
 def main():
     conf.check_files()
@@ -73,6 +80,7 @@ def main():
 if __name__ == "__main__":
     log("=====DATAPROCESSOR STRARTING=====")
     processor = PROCESSOR()
+    signal.signal(signal.SIGTERM, on_sigterm)
     try:
         main()
     finally:
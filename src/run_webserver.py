@@ -1,21 +1,34 @@
 from tornado import httpserver, ioloop, web, websocket
+from tornado.iostream import StreamClosedError
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import os
 import json
 import random
-from faceid.recognize import Recognizer
-import mysql.connector
+from broadcast_hub import BroadcastHub
+from db_pool import DBPool
+from downsampling import METHODS, METRICS, downsample_records
+from face_service import FaceService, FaceUnavailable
+from local_ipc import IpcServer
+from live_mqtt import LiveMqtt
+from mysql.connector import Error, errorcode
+from response_cache import ResponseCache
+from rollups import bucket_start
+from session_cache import SessionCache
+from timeseries_buffer import TimeSeriesBuffer
 from datetime import datetime, timedelta, date, timezone
 import config as conf
 import hashlib
 import uuid
-import cv2
-import numpy as np
 import base64
 from urllib.request import urlopen
 from decimal import Decimal
+from email.utils import formatdate, parsedate_to_datetime
 
 
-rec = Recognizer()
+FACES = FaceService()  # models load in worker processes, see face_service.py
 
 
 # --- Hashing Utility ---
@@ -31,9 +44,18 @@ KEYFILE_PATH = "certification/key.pem"
 CA_CERTS = "certification/fullchain.pem"
 
 
-def get_db_connection():
-    conn = mysql.connector.connect(**conf.MYSQL_CONFIG)
-    return conn
+DB_POOL = DBPool()
+SESSIONS = SessionCache()
+RECENT = TimeSeriesBuffer()  # recent readings, fed by NewDataHandler
+HISTORY_CACHE = ResponseCache()  # aggregated /api/history responses
+# Blocking DB calls run here, never on the IOLoop. One thread per pooled
+# connection, so a thread never waits for a connection.
+DB_EXECUTOR = ThreadPoolExecutor(max_workers=conf.DB_POOL_SIZE, thread_name_prefix="db")
+
+
+async def run_db(fn, *args):
+    """Run blocking `fn(*args)` on DB_EXECUTOR and await the result."""
+    return await ioloop.IOLoop.current().run_in_executor(DB_EXECUTOR, fn, *args)
 
 
 def json_default(o):
@@ -49,35 +71,237 @@ def hash_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
 
 
+# --- Blocking DB queries (run through run_db) ---
+def load_user(session_id):
+    """Look up session (one round trip), cache and return its user or None."""
+    with DB_POOL.cursor(dictionary=True) as cursor:
+        query = (
+            "SELECT u.id, u.username, s.expires_at FROM sessions s "
+            "JOIN users u ON u.id = s.user_id "
+            "WHERE s.session_id = %s AND s.expires_at > NOW()"
+        )
+        cursor.execute(query, (session_id,))
+        row = cursor.fetchone()
+
+    if not row:
+        SESSIONS.put(session_id, None)
+        return None
+
+    user = {"id": row["id"], "username": row["username"]}
+    SESSIONS.put(session_id, user, row["expires_at"])
+    return user
+
+
+def create_session(username, password=None):
+    """
+    Insert new session for `username` and return its id. With `password`
+    the password must match, None means already authenticated (face login).
+    Returns None for unknown user or wrong password.
+    """
+    with DB_POOL.cursor(dictionary=True) as cursor:
+        query = "SELECT * FROM users WHERE username = %s"
+        cursor.execute(query, (username,))
+        user = cursor.fetchone()
+
+        if not user or (password is not None and user["password_hash"] != password):
+            return None
+
+        session_id = str(uuid.uuid4())
+        expires_at = datetime.now() + timedelta(days=7)
+
+        insert_query = (
+            "INSERT INTO sessions (session_id, user_id, expires_at) VALUES (%s, %s, %s)"
+        )
+        cursor.execute(insert_query, (session_id, user["id"], expires_at))
+
+    SESSIONS.put(
+        session_id, {"id": user["id"], "username": user["username"]}, expires_at
+    )
+    return session_id
+
+
+def delete_session(session_id):
+    with DB_POOL.cursor() as cursor:
+        query = "DELETE FROM sessions WHERE session_id = %s"
+        cursor.execute(query, (session_id,))
+    SESSIONS.invalidate(session_id)
+
+
+def format_reading(record):
+    """Format numerical values and fix timezone of one row (in place)."""
+    if "time" in record and record["time"] and record["time"].tzinfo is None:
+        record["time"] = record["time"].replace(tzinfo=timezone.utc)
+    if "temperature" in record and record["temperature"] is not None:
+        record["temperature"] = round(float(record["temperature"]), 2)
+    if "humidity" in record and record["humidity"] is not None:
+        record["humidity"] = round(float(record["humidity"]), 1)
+    if "lightness" in record and record["lightness"] is not None:
+        record["lightness"] = int(round(float(record["lightness"]), 0))
+
+
+def fetch_readings(query, params):
+    """Run readings query, return rows with UTC aware times and rounded values."""
+    with DB_POOL.cursor(dictionary=True) as cursor:
+        cursor.execute(query, params)
+        results = cursor.fetchall()
+
+    for record in results:
+        format_reading(record)
+    return results
+
+
+def encode_chunk(records, fmt):
+    """
+    JSON of one chunk of readings, the response is `[chunk,chunk,...]`.
+    rows:    rows are the items of the response array
+    columns: chunk is one {"team": [...], "time": [...], ...} object
+    """
+    if fmt == "columns":
+        return json.dumps(
+            {name: [r[name] for r in records] for name in records[0]},
+            default=json_default,
+        )
+    return json.dumps(records, default=json_default)[1:-1]
+
+
+def stream_readings(query, params, fmt, put, cancelled):
+    """
+    Run readings query with unbuffered cursor, call put(encoded chunk) for
+    every HISTORY_CHUNK_ROWS rows. Memory use does not depend on the result size.
+    """
+    with DB_POOL.connection() as conn:
+        cursor = conn.cursor(dictionary=True, buffered=False)
+        try:
+            cursor.execute(query, params)
+            while rows := cursor.fetchmany(conf.HISTORY_CHUNK_ROWS):
+                for record in rows:
+                    format_reading(record)
+                put(encode_chunk(rows, fmt))
+                if cancelled.is_set():
+                    break  # client is gone
+        finally:
+            # cancelled or failed midway: rows left unread would break the
+            # next query on the pooled connection, a connection error while
+            # reading them makes the pool discard it
+            if conn.unread_result:
+                conn.consume_results()
+            cursor.close()
+
+
 # --- Base Handler for User Authentication ---
 class BaseHandler(web.RequestHandler):
-    def get_current_user(self):
+    async def prepare(self):
+        # get_current_user() can not await, so the user is looked up here
         session_id = self.get_secure_cookie("session_id")
         if not session_id:
-            return None
+            self.current_user = None
+            return
 
-        try:
-            conn = get_db_connection()
-            cursor = conn.cursor(dictionary=True)
+        session_id = session_id.decode()
+        found, user = SESSIONS.get(session_id)
+        if not found:
+            user = await run_db(load_user, session_id)
+        self.current_user = user
+
+
+def reading_from_payload(payload):
+    """Record for RECENT / broadcast_single_update, raises ValueError if invalid."""
+    if not isinstance(payload, dict):
+        raise ValueError("Payload is not a JSON object.")
+    team_name = payload.get("team_name")
+    timestamp_str = payload.get("timestamp")
+    temperature = payload.get("temperature")
+    humidity = payload.get("humidity")
+    illumination = payload.get("illumination")
+
+    # Basic validation for presence of all required fields
+    # team_name, timestamp, temperature are still required
+    if not all([team_name, timestamp_str, temperature is not None]):
+        raise ValueError(
+            "Missing required data in payload. "
+            "Required: team_name, timestamp, temperature."
+        )
+    # every team gets its own RECENT ring, unknown names would allocate new ones
+    if not isinstance(team_name, str) or team_name not in conf.VALID_TEAMS:
+        raise ValueError(f"Invalid team_name: {team_name}")
+    if not isinstance(timestamp_str, str):
+        raise ValueError(f"Invalid timestamp format: '{timestamp_str}'.")
+
+    # Convert timestamp string to datetime object
+    try:
+        # Assuming ISO format (e.g., "YYYY-MM-DDTHH:MM:SS" or "YYYY-MM-DD HH:MM:SS")
+        dt_obj = datetime.fromisoformat(timestamp_str.replace("Z", "+00:00"))
+        # If the incoming timestamp is naive (no timezone), assume it's UTC
+        # and make it aware.
+        if dt_obj.tzinfo is None:
+            dt_obj = dt_obj.replace(tzinfo=timezone.utc)
+        timestamp = dt_obj
+    except ValueError:
+        raise ValueError(
+            f"Invalid timestamp format: '{timestamp_str}'. "
+            "Expected ISO format (e.g., YYYY-MM-DDTHH:MM:SS)."
+        ) from None
+
+    # Construct the record in the format expected by broadcast_single_update
+    try:
+        return {
+            "team": team_name,
+            "time": timestamp,
+            "temperature": float(temperature),
+            # humidity and lightness are optional
+            "humidity": float(humidity) if humidity is not None else None,
+            "lightness": float(illumination) if illumination is not None else None,
+        }
+    except (TypeError, ValueError):
+        raise ValueError("Invalid sensor value, numbers expected.") from None
+
+
+def publish_reading(record):
+    RECENT.add(record)
+    HISTORY_CACHE.touch(record["team"])
+    # Broadcast the received data to all connected WebSocket clients
+    SensorSocketHandler.broadcast_single_update(record)
+
+
+def on_new_reading(payload):
+    """New reading from the dataprocessor (local socket) or from MQTT (LIVE_MQTT)."""
+    try:
+        publish_reading(reading_from_payload(payload))
+    except (ValueError, TypeError, AttributeError) as e:
+        print("Invalid reading:", e)
+
+
+def on_reading_gap(start, end):
+    """Readings between `start` and `end` (UNIX times) did not reach RECENT."""
+    RECENT.mark_gap(start, end)
+    # the dataprocessor has written them to the DB after DB_BATCH_MAX_AGE
+    ioloop.IOLoop.current().call_later(
+        conf.DB_BATCH_MAX_AGE + 1.0, fill_recent_gap, start, end
+    )
 
-            query = (
-                "SELECT * FROM sessions WHERE session_id = %s AND expires_at > NOW()"
-            )
-            cursor.execute(query, (session_id.decode(),))
-            session = cursor.fetchone()
 
-            if not session:
-                return None
+async def fill_recent_gap(start, end):
+    query = (
+        "SELECT team, temperature, humidity, lightness, time FROM prod "
+        "WHERE time >= %s AND time <= %s ORDER BY time ASC"
+    )
+    params = tuple(
+        datetime.fromtimestamp(t, timezone.utc).replace(tzinfo=None)
+        for t in (start, end)
+    )
+    try:
+        records = await run_db(fetch_readings, query, params)
+    except Error as e:
+        # the gap stays, RECENT.covers() keeps sending such windows to the DB
+        print("Could not fill gap in recent readings buffer:", e)
+        ioloop.IOLoop.current().call_later(
+            conf.TS_BUFFER_FILL_RETRY, fill_recent_gap, start, end
+        )
+        return
+    RECENT.fill(records, start, end)
 
-            query = "SELECT id, username FROM users WHERE id = %s"
-            cursor.execute(query, (session["user_id"],))
-            user = cursor.fetchone()
-            return user
-        finally:
-            if "cursor" in locals() and cursor:
-                cursor.close()
-            if "conn" in locals() and conn.is_connected():
-                conn.close()
+
+LIVE_MQTT = LiveMqtt(on_new_reading, on_reading_gap) if conf.LIVE_MQTT else None
 
 
 class NewDataHandler(web.RequestHandler):
@@ -85,44 +309,14 @@ class NewDataHandler(web.RequestHandler):
         try:
             # Parse the JSON payload from the request body
             payload = json.loads(self.request.body)
-            print("Received payload:", payload)
-            team_name = payload.get('team_name')
-            timestamp_str = payload.get('timestamp')
-            temperature = payload.get('temperature')
-            humidity = payload.get('humidity')
-            illumination = payload.get('illumination')
-
-            # Basic validation for presence of all required fields
-            # team_name, timestamp, temperature are still required
-            if not all([team_name, timestamp_str, temperature is not None]):
-                self.set_status(400)
-                self.write({"error": "Missing required data in payload. Required: team_name, timestamp, temperature."})
-                return
-
-            # Convert timestamp string to datetime object
             try:
-                # Assuming ISO format (e.g., "YYYY-MM-DDTHH:MM:SS" or "YYYY-MM-DD HH:MM:SS")
-                dt_obj = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-                # If the incoming timestamp is naive (no timezone), assume it's UTC and make it aware.
-                if dt_obj.tzinfo is None:
-                    dt_obj = dt_obj.replace(tzinfo=timezone.utc)
-                timestamp = dt_obj
-            except ValueError:
+                record = reading_from_payload(payload)
+            except ValueError as e:
                 self.set_status(400)
-                self.write({"error": f"Invalid timestamp format: '{timestamp_str}'. Expected ISO format (e.g., YYYY-MM-DDTHH:MM:SS)."})
+                self.write({"error": str(e)})
                 return
 
-            # Construct the record in the format expected by broadcast_single_update
-            record = {
-                "team": team_name,
-                "time": timestamp,
-                "temperature": float(temperature),
-                "humidity": float(humidity) if humidity is not None else None, # Make optional
-                "lightness": float(illumination) if illumination is not None else None, # Make optional
-            }
-            print("Processed record for broadcasting:", record)
-            # Broadcast the received data to all connected WebSocket clients
-            SensorSocketHandler.broadcast_single_update(record)
+            publish_reading(record)
 
             self.write({"status": "ok"})
 
@@ -136,78 +330,312 @@ class NewDataHandler(web.RequestHandler):
 
 
 class HistoryDataHandler(BaseHandler):
-    def get(self):
-        if not self.get_current_user():
+    # range: (length, rollup bucket size in seconds, None means raw rows)
+    RANGES = {
+        "1h": (timedelta(hours=1), None),
+        "12h": (timedelta(hours=12), 5 * 60),  # 5 minutes
+        "1d": (timedelta(days=1), 15 * 60),  # 15 minutes
+        "7d": (timedelta(days=7), 60 * 60),  # 1 hour
+        "1m": (timedelta(days=30), 6 * 60 * 60),  # 6 hours
+        "all": (None, 24 * 60 * 60),  # 1 day
+    }
+
+    async def get(self):
+        if not self.current_user:
             self.set_status(403)
             self.write({"error": "Forbidden"})
             return
 
-        time_range = self.get_argument("range", "1h")
-        now = datetime.now(timezone.utc)
-
-        # Define the aggregation interval and start time based on the range parameter
-        agg_interval_seconds = None
-        if time_range == "12h":
-            start_time = now - timedelta(hours=12)
-            agg_interval_seconds = 5 * 60  # 5 minutes
-        elif time_range == "1d":
-            start_time = now - timedelta(days=1)
-            agg_interval_seconds = 15 * 60  # 15 minutes
-        elif time_range == "7d":
-            start_time = now - timedelta(days=7)
-            agg_interval_seconds = 60 * 60  # 1 hour
-        elif time_range == "1m":
-            start_time = now - timedelta(days=30)
-            agg_interval_seconds = 6 * 60 * 60  # 6 hours
-        elif time_range == "all":
-            start_time = None
-            agg_interval_seconds = 24 * 60 * 60  # 1 day
-        else:  # Default to 1h
-            start_time = now - timedelta(hours=1)
-
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        params = []
-        if start_time:
-            # Convert aware datetime to naive datetime in UTC for the DB driver
-            params.append(start_time.replace(tzinfo=None))
+        fmt = self.get_argument("format", "rows")
+        if fmt not in ("rows", "columns"):
+            self.set_status(400)
+            self.write({"error": "Unknown format, use rows or columns"})
+            return
+        # points=N: at most N rows per team (downsampled)
+        method = self.get_argument("method", "lttb")
+        try:
+            points = int(self.get_argument("points", 0))
+        except ValueError:
+            points = -1
+        if points < 0 or method not in METHODS:
+            self.set_status(400)
+            self.write(
+                {"error": f"points must be a positive number, method one of {METHODS}"}
+            )
+            return
+        try:
+            start_time, end_time, agg_interval_seconds = self.time_window()
+            teams = self.list_argument("team", sorted(conf.VALID_TEAMS))
+            metrics = self.list_argument("metrics", METRICS)
+        except ValueError as e:
+            self.set_status(400)
+            self.write({"error": str(e)})
+            return
 
+        # Teams are always listed, so the (team, time) index is used for
+        # every query, also when all teams are requested.
+        team_filter = f"team IN ({', '.join(['%s'] * len(teams))})"
+        params = list(teams)
         if agg_interval_seconds:
-            # The query uses integer division on UNIX timestamps to group records into time intervals.
-            # It calculates the average for temperature, humidity, and lightness.
+            # Averages come from the pre-aggregated buckets (see rollups.py),
+            # the bucket containing start_time is included whole.
+            source = f"rollup:{agg_interval_seconds}"
+            columns = ", ".join(
+                f"{m}_sum / NULLIF({m}_count, 0) as {m}" for m in metrics
+            )
+            query = f"""
+                SELECT team, {columns}, bucket_start as time
+                FROM prod_rollup
+                WHERE bucket_seconds = %s AND {team_filter}
+                    {'AND bucket_start > %s' if start_time else ''}
+                    {'AND bucket_start < %s' if end_time else ''}
+                ORDER BY bucket_start ASC
+            """
+            params.insert(0, agg_interval_seconds)
+            if start_time:
+                # Convert aware datetime to naive datetime in UTC for the DB driver
+                first_bucket = start_time - timedelta(seconds=agg_interval_seconds)
+                params.append(first_bucket.replace(tzinfo=None))
+        elif RECENT.covers(start_time):
+            source = "memory"
+            query = None
+        else:
+            source = "raw"
             query = f"""
-                SELECT
-                    team,
-                    AVG(temperature) as temperature,
-                    AVG(humidity) as humidity,
-                    AVG(lightness) as lightness,
-                    FROM_UNIXTIME(FLOOR(UNIX_TIMESTAMP(time) / {agg_interval_seconds}) * {agg_interval_seconds}) as time
+                SELECT team, {', '.join(metrics)}, time
                 FROM prod
-                {'WHERE time >= %s' if start_time else ''}
-                GROUP BY team, FLOOR(UNIX_TIMESTAMP(time) / {agg_interval_seconds})
+                WHERE {team_filter} AND time >= %s {'AND time < %s' if end_time else ''}
                 ORDER BY time ASC
             """
+            params.append(start_time.replace(tzinfo=None))
+        if end_time and query:
+            params.append(end_time.replace(tzinfo=None))
+
+        self.set_header("Content-Type", "application/json; charset=UTF-8")
+        self.set_header("X-History-Source", source)
+        if agg_interval_seconds:
+            # rollup results are small, whole responses are cached
+            window = (
+                start_time.timestamp() // agg_interval_seconds if start_time else None,
+                (end_time or datetime.now(timezone.utc)).timestamp()
+                // agg_interval_seconds,
+            )
+            key = (
+                agg_interval_seconds,
+                window,
+                tuple(teams),
+                tuple(metrics),
+                fmt,
+                points,
+                method,
+            )
+            entry = HISTORY_CACHE.get(key, teams)
+            if entry is None:
+                versions, started = HISTORY_CACHE.versions(teams), time.time()
+                try:
+                    results = await run_db(fetch_readings, query, tuple(params))
+                except Error as e:
+                    if e.errno != errorcode.ER_NO_SUCH_TABLE:
+                        raise
+                    # prod_rollup is not created yet (sql/001_prod_rollup.sql),
+                    # group the raw rows instead, not cached
+                    self.set_header("X-History-Source", f"prod:{agg_interval_seconds}")
+                    results = await run_db(
+                        fetch_readings,
+                        *self.grouped_query(
+                            teams, metrics, start_time, end_time, agg_interval_seconds
+                        ),
+                    )
+                    versions = None
+                if points:
+                    results = await run_db(
+                        downsample_records, results, points, method, metrics
+                    )
+                body = (f"[{encode_chunk(results, fmt)}]" if results else "[]").encode()
+                if versions is None:
+                    self.write(body)
+                    return
+                entry = HISTORY_CACHE.put(key, teams, versions, started, body)
+            self.write_cached(entry)
+            return
+
+        if query and not points:
+            await self.write_stream(query, tuple(params), fmt)
+            return
+
+        if query:
+            results = await run_db(fetch_readings, query, tuple(params))
         else:
-            query = "SELECT team, temperature, humidity, lightness, time FROM prod WHERE time >= %s ORDER BY time ASC"
+            results = RECENT.records(start_time, end_time, teams, metrics)
+        if points:
+            # whole series is needed for downsampling, done off the IOLoop
+            results = await run_db(downsample_records, results, points, method, metrics)
+        self.write(f"[{encode_chunk(results, fmt)}]" if results else "[]")
+
+    @staticmethod
+    def grouped_query(teams, metrics, start_time, end_time, seconds):
+        """
+        (query, params) averaging prod rows into the same buckets as the
+        rollups, for when the prod_rollup table is missing. Slow on long
+        ranges, every row of the range is read.
+        """
+        bucket = bucket_start("time", str(seconds))
+        columns = ", ".join(f"AVG({m}) as {m}" for m in metrics)
+        params = list(teams)
+        conditions = [f"team IN ({', '.join(['%s'] * len(teams))})"]
+        if start_time:
+            # whole bucket containing start_time, like the rollup query
+            first_bucket = start_time.timestamp() // seconds * seconds
+            conditions.append("time >= %s")
+            params.append(
+                datetime.fromtimestamp(first_bucket, timezone.utc).replace(tzinfo=None)
+            )
+        if end_time:
+            conditions.append("time < %s")
+            params.append(end_time.replace(tzinfo=None))
+        query = f"""
+            SELECT team, {columns}, {bucket} as time
+            FROM prod
+            WHERE {' AND '.join(conditions)}
+            GROUP BY team, {bucket}
+            ORDER BY time ASC
+        """
+        return query, tuple(params)
+
+    def write_cached(self, entry):
+        """Send cached response, or 304 if the client has it already."""
+        self.set_header("Etag", f'"{entry.etag}"')
+        self.set_header("Last-Modified", formatdate(entry.modified, usegmt=True))
+        self.set_header("Cache-Control", "no-cache")  # always revalidate
+
+        modified_since = self.request.headers.get("If-Modified-Since")
+        try:
+            not_modified = self.check_etag_header() or (
+                "If-None-Match" not in self.request.headers
+                and modified_since
+                and parsedate_to_datetime(modified_since).timestamp() >= entry.modified
+            )
+        except (TypeError, ValueError):
+            not_modified = False  # malformed date
+        if not_modified:
+            HISTORY_CACHE.not_modified += 1
+            self.set_status(304)
+            return
+        self.write(entry.body)
+
+    def time_window(self):
+        """
+        (start, end, rollup bucket size) from either range=<preset> or
+        from=<ISO time>[&to=<ISO time>] (UTC if no offset is given). For
+        from/to the bucket is the smallest one giving at most
+        HISTORY_MAX_BUCKETS points, raw rows up to HISTORY_RAW_MAX_SPAN.
+        """
+        now = datetime.now(timezone.utc)
+        start_arg = self.get_argument("from", None)
+        end_arg = self.get_argument("to", None)
+        if start_arg is None:
+            if end_arg is not None:
+                raise ValueError("Parameter to needs from")
+            length, agg_interval_seconds = self.RANGES.get(
+                self.get_argument("range", "1h"), self.RANGES["1h"]
+            )
+            return (now - length if length else None), None, agg_interval_seconds
+
+        start_time = self.parse_time(start_arg)
+        end_time = self.parse_time(end_arg) if end_arg else None
+        span = ((end_time or now) - start_time).total_seconds()
+        if span <= 0:
+            raise ValueError("Parameter from must be before to")
+        if span <= conf.HISTORY_RAW_MAX_SPAN:
+            return start_time, end_time, None
+        for seconds in sorted(conf.ROLLUP_INTERVALS):
+            if span / seconds <= conf.HISTORY_MAX_BUCKETS:
+                break
+        return start_time, end_time, seconds
+
+    @staticmethod
+    def parse_time(value):
+        try:
+            dt_obj = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            raise ValueError(f"Invalid time: '{value}'. Expected ISO format.") from None
+        return dt_obj if dt_obj.tzinfo else dt_obj.replace(tzinfo=timezone.utc)
+
+    def list_argument(self, name, allowed):
+        """Comma separated (or repeated) argument, all `allowed` if missing."""
+        values = [v for arg in self.get_arguments(name) for v in arg.split(",") if v]
+        if not values:
+            return list(allowed)
+        unknown = set(values) - set(allowed)
+        if unknown:
+            raise ValueError(f"Unknown {name}: {', '.join(sorted(unknown))}")
+        return [v for v in allowed if v in values]
+
+    async def write_stream(self, query, params, fmt):
+        """Send the query result as it is read, at most two chunks are buffered."""
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue(maxsize=2)
+        cancelled = threading.Event()
+
+        def put(chunk):  # called from the DB thread, waits while the queue is full
+            asyncio.run_coroutine_threadsafe(chunks.put(chunk), loop).result()
+
+        async def produce():
+            try:
+                await run_db(stream_readings, query, params, fmt, put, cancelled)
+            finally:
+                await chunks.put(None)
 
-        cursor.execute(query, tuple(params))
-        results = cursor.fetchall()
+        producer = asyncio.ensure_future(produce())
+        separator = "["
+        try:
+            while (chunk := await chunks.get()) is not None:
+                self.write(separator + chunk)
+                separator = ","
+                await self.flush()
+        except StreamClosedError:
+            cancelled.set()
+            while await chunks.get() is not None:
+                pass  # let the DB thread finish
+            await producer
+            return
+        await producer  # raises DB errors
+        self.write("[]" if separator == "[" else "]")
 
-        # Format numerical values and fix timezones
-        for record in results:
-            if 'time' in record and record['time'] and record['time'].tzinfo is None:
-                record['time'] = record['time'].replace(tzinfo=timezone.utc)
-            if 'temperature' in record and record['temperature'] is not None:
-                record['temperature'] = round(float(record['temperature']), 2)
-            if 'humidity' in record and record['humidity'] is not None:
-                record['humidity'] = round(float(record['humidity']), 1)
-            if 'lightness' in record and record['lightness'] is not None:
-                record['lightness'] = int(round(float(record['lightness']), 0))
 
-        cursor.close()
-        conn.close()
-        self.write(json.dumps(results, default=json_default))
+class MetricsHandler(BaseHandler):
+    def get(self):
+        if not self.current_user:
+            self.set_status(403)
+            self.write({"error": "Forbidden"})
+            return
+
+        self.write(
+            {
+                "db_pool": DB_POOL.stats(),
+                "sessions": SESSIONS.stats(),
+                "recent_buffer": RECENT.stats(),
+                "websocket": SensorSocketHandler.hub.stats(),
+                "history_cache": HISTORY_CACHE.stats(),
+                "face": FACES.stats(),
+                "live_mqtt": LIVE_MQTT.stats() if LIVE_MQTT else None,
+            }
+        )
+
+
+def warm_recent_buffer():
+    """Load the last TS_BUFFER_WINDOW seconds of readings into RECENT."""
+    since = datetime.now(timezone.utc) - timedelta(seconds=conf.TS_BUFFER_WINDOW)
+    query = (
+        "SELECT team, temperature, humidity, lightness, time FROM prod "
+        "WHERE time >= %s ORDER BY time ASC"
+    )
+    try:
+        RECENT.warm(fetch_readings(query, (since.replace(tzinfo=None),)), since)
+        print("Recent readings buffer warmed:", RECENT.stats())
+    except Error as e:
+        # not fatal, the buffer fills up from live data
+        print("Could not warm recent readings buffer:", e)
 
 
 def check_files():
@@ -219,7 +647,7 @@ def check_files():
 
 class RootHandler(BaseHandler):
     def get(self):
-        current_user = self.get_current_user()
+        current_user = self.current_user
         self.render(
             INDEX_PATH,
             is_logged_in=(current_user is not None),
@@ -233,88 +661,104 @@ class LoginRenderHandler(web.RequestHandler):
 
 
 class LoginActionHandler(BaseHandler):
-    def post(self):
+    async def prepare(self):
+        pass  # no session lookup needed to log in
+
+    async def post(self):
         username = self.get_argument("username")
         password = self.get_argument("password")
 
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        query = "SELECT * FROM users WHERE username = %s"
-        cursor.execute(query, (username,))
-        user = cursor.fetchone()
-
-        if user and user["password_hash"] == password:
-            session_id = str(uuid.uuid4())
-            expires_at = datetime.now() + timedelta(days=7)
-
-            insert_query = "INSERT INTO sessions (session_id, user_id, expires_at) VALUES (%s, %s, %s)"
-            cursor.execute(insert_query, (session_id, user["id"], expires_at))
-            conn.commit()
+        session_id = await run_db(create_session, username, password)
 
+        if session_id:
             self.set_secure_cookie("session_id", session_id, expires_days=7)
             self.redirect("/")
         else:
             self.render(LOGIN_PATH, error="Invalid username or password")
 
-        cursor.close()
-        conn.close()
-
 
 class LogoutHandler(BaseHandler):
-    def get(self):
+    async def prepare(self):
+        pass
+
+    async def get(self):
         session_id = self.get_secure_cookie("session_id")
         if session_id:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            query = "DELETE FROM sessions WHERE session_id = %s"
-            cursor.execute(query, (session_id.decode(),))
-            conn.commit()
-            cursor.close()
-            conn.close()
+            await run_db(delete_session, session_id.decode())
 
         self.clear_cookie("session_id")
         self.redirect("/login")
 
 
 class SensorSocketHandler(websocket.WebSocketHandler):
-    clients = set()
+    hub = BroadcastHub(encode=lambda message: json.dumps(message, default=json_default))
     team_map = {"blue": 1, "yellow": 2, "green": 3, "red": 4, "black": 5}
+    metrics = ("temperature", "humidity", "lightness")
+    _batch = {}  # team: update payloads of the current tick, in arrival order
 
-    def open(self):
-        SensorSocketHandler.clients.add(self)
+    def get_compression_options(self):
+        # permessage-deflate, compressed separately for every client
+        return {} if conf.WS_COMPRESSION else None
 
-        # Query DB for the last 10 minutes of data to send as initial state
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        ten_minutes_ago = datetime.now(timezone.utc) - timedelta(minutes=10)
-        query = "SELECT team, temperature, humidity, lightness, time FROM prod WHERE time >= %s ORDER BY time ASC"
-        cursor.execute(query, (ten_minutes_ago,))
-        results = cursor.fetchall()
-        cursor.close()
-        conn.close()
+    async def open(self):
+        SensorSocketHandler.hub.add(self)
 
-        # Make all time objects timezone-aware before sending
-        for record in results:
-            if 'time' in record and record['time'] and record['time'].tzinfo is None:
-                record['time'] = record['time'].replace(tzinfo=timezone.utc)
+        # Last 10 minutes of data as initial state, from memory when possible
+        ten_minutes_ago = datetime.now(timezone.utc) - timedelta(minutes=10)
+        if RECENT.covers(ten_minutes_ago):
+            results = RECENT.records(ten_minutes_ago)
+        else:
+            query = (
+                "SELECT team, temperature, humidity, lightness, time FROM prod "
+                "WHERE time >= %s ORDER BY time ASC"
+            )
+            results = await run_db(fetch_readings, query, (ten_minutes_ago,))
 
-        print("Sending initial data:", results)
-        # The initial message contains all data points from the last 3 minutes
+        # The initial message contains all data points from the last 10 minutes
         initial_message = {"type": "initial_data", "payload": results}
-        self.write_message(json.dumps(initial_message, default=json_default))
+        try:
+            self.write_message(json.dumps(initial_message, default=json_default))
+        except websocket.WebSocketClosedError:
+            pass  # closed while the query ran
+
+    def on_message(self, message):
+        # {"type": "subscribe", "teams": [...], "metrics": [...]}, a missing
+        # or null list means all of them
+        try:
+            request = json.loads(message)
+            if request.get("type") != "subscribe":
+                raise ValueError(f"Unknown message type: {request.get('type')}")
+            teams = self._subset(request.get("teams"), self.team_map)
+            metrics = self._subset(request.get("metrics"), self.metrics)
+        except (ValueError, AttributeError) as e:
+            self.write_message({"type": "error", "error": str(e)})
+            return
+        SensorSocketHandler.hub.subscribe(self, (teams, metrics))
+
+    @staticmethod
+    def _subset(names, allowed):
+        if names is None:
+            return None
+        if (
+            not isinstance(names, list)
+            or not all(isinstance(name, str) for name in names)
+            or not set(names) <= set(allowed)
+        ):
+            raise ValueError(f"Expected list with items from {list(allowed)}")
+        return frozenset(names)
 
     def on_close(self):
-        SensorSocketHandler.clients.remove(self)
+        SensorSocketHandler.hub.discard(self)
 
     @classmethod
     def broadcast_single_update(cls, record):
-        # This method now just formats the DB record and broadcasts it.
+        # The update waits for the next tick, all updates of the tick are sent.
         team_name_lower = record["team"].lower()
         sensor_id = cls.team_map.get(team_name_lower)
 
         if sensor_id is not None:
             # The payload is the raw record from the DB, plus the sensor ID.
-            payload = {
+            update = {
                 "id": sensor_id,
                 "team": record["team"],
                 "time": record["time"],
@@ -324,14 +768,46 @@ class SensorSocketHandler(websocket.WebSocketHandler):
                     "lightness": record["lightness"],
                 },
             }
-            update_message = {"type": "update", "payload": payload}
-            print("Broadcasting update:", update_message)
-            for client in cls.clients:
-                client.write_message(json.dumps(update_message, default=json_default))
+            cls._batch.setdefault(team_name_lower, []).append(update)
+
+    @classmethod
+    def flush_updates(cls):
+        """
+        Send the updates of this tick, one update_batch frame per team with
+        all its readings (replayed backlogs too) for every subscription.
+        """
+        if not cls._batch:
+            return
+        batches, cls._batch = cls._batch, {}
+
+        for team, batch in batches.items():
+
+            def batch_for(subscription, team=team, batch=batch):
+                teams, metrics = subscription or (None, None)
+                if teams is not None and team not in teams:
+                    return None
+                payload = [
+                    {
+                        **update,
+                        "data": {
+                            k: v
+                            for k, v in update["data"].items()
+                            if metrics is None or k in metrics
+                        },
+                    }
+                    for update in batch
+                ]
+                return {"type": "update_batch", "payload": payload}
+
+            # a slow client gets the newest waiting batch of every team
+            cls.hub.publish_by(batch_for, key=("update_batch", team))
 
 
 class FaceLoginHandler(BaseHandler):
-    def post(self):
+    async def prepare(self):
+        pass
+
+    async def post(self):
         try:
             body = json.loads(self.request.body)
             image_data_url = body["image"]
@@ -345,46 +821,36 @@ class FaceLoginHandler(BaseHandler):
             # Decode the base64 image
             header, encoded = image_data_url.split(",", 1)
             image_bytes = base64.b64decode(encoded)
-
-            # Convert to numpy array
-            nparr = np.frombuffer(image_bytes, np.uint8)
-            image_array = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            # decoded and recognized in a worker process
+            recognized_name = await FACES.recognize(image_bytes)
+        except FaceUnavailable as e:
+            self.set_status(503)
+            self.set_header("Retry-After", "5")
+            self.write({"error": str(e)})
+            return
+        except asyncio.TimeoutError:
+            self.set_status(504)
+            self.write({"error": "Face recognition timed out"})
+            return
         except Exception as e:
             self.set_status(400)
             self.write({"error": f"Could not process image data: {e}"})
             return
 
-        # Call the placeholder recognition function
-        recognized_name = rec.recognize(image_array)
-
         # Check if recognition was successful and matches the typed username
         if (
             recognized_name != "unknown"
             and recognized_name.lower() == typed_username.lower()
         ):
             # Successful login, create session
-            conn = get_db_connection()
-            cursor = conn.cursor(dictionary=True)
-            query = "SELECT * FROM users WHERE username = %s"
-            cursor.execute(query, (typed_username,))
-            user = cursor.fetchone()
-
-            if user:
-                session_id = str(uuid.uuid4())
-                expires_at = datetime.now() + timedelta(days=7)
-
-                insert_query = "INSERT INTO sessions (session_id, user_id, expires_at) VALUES (%s, %s, %s)"
-                cursor.execute(insert_query, (session_id, user["id"], expires_at))
-                conn.commit()
+            session_id = await run_db(create_session, typed_username)
 
+            if session_id:
                 self.set_secure_cookie("session_id", session_id, expires_days=7)
                 self.write({"status": "success"})
             else:
                 self.set_status(401)
                 self.write({"error": "User not found in database"})
-
-            cursor.close()
-            conn.close()
         else:
             # Failed login
             self.set_status(401)
@@ -394,6 +860,8 @@ class FaceLoginHandler(BaseHandler):
 if __name__ == "__main__":
     print("Server is starting")
     check_files()
+    started = time.time()
+    warm_recent_buffer()
     app = web.Application(
         [
             (r"/", RootHandler),
@@ -413,8 +881,10 @@ if __name__ == "__main__":
             ),
             (r"/api/history", HistoryDataHandler),
             (r"/api/newData", NewDataHandler),
+            (r"/api/metrics", MetricsHandler),
         ],
         cookie_secret=conf.COOKIE_CONFIG,
+        compress_response=True,  # gzip, also for streamed /api/history
     )
     server = httpserver.HTTPServer(
         app,
@@ -425,4 +895,15 @@ if __name__ == "__main__":
         },
     )
     server.listen(443)
+    ioloop.IOLoop.current().add_callback(FACES.start)  # warms up in the background
+    if LIVE_MQTT:
+        ioloop.IOLoop.current().add_callback(LIVE_MQTT.start)
+    else:
+        IpcServer(on_new_reading, on_reading_gap).listen_unix(conf.IPC_SOCKET_PATH)
+    # readings not in the DB yet when it was queried and the ones sent before
+    # listening are missing (MQTT: until subscribed, LiveMqtt reports that)
+    on_reading_gap(started - conf.DB_BATCH_MAX_AGE, time.time())
+    ioloop.PeriodicCallback(
+        SensorSocketHandler.flush_updates, 1000 * conf.WS_COALESCE_INTERVAL
+    ).start()
     ioloop.IOLoop.instance().start()
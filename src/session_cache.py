@@ -0,0 +1,77 @@
+import threading
+import time
+from collections import OrderedDict
+
+import config as conf
+
+
+class SessionCache:
+    """
+    TTL + LRU cache of session_id -> user (dict with id and username).
+
+    Unknown or expired session ids are cached too (as None) for the shorter
+    `negative_ttl`. A positive entry never outlives the session `expires_at`.
+    Sessions deleted outside of this process are noticed after `ttl` at most.
+    """
+
+    def __init__(
+        self,
+        ttl=conf.SESSION_CACHE_TTL,
+        negative_ttl=conf.SESSION_CACHE_NEGATIVE_TTL,
+        max_size=conf.SESSION_CACHE_SIZE,
+    ):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()  # session_id: (user or None, valid until)
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, session_id):
+        """Return (found, user), user is None for a known invalid session."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None or entry[1] <= now:
+                if entry is not None:
+                    del self._entries[session_id]
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(session_id)
+            self.hits += 1
+            return True, entry[0]
+
+    def put(self, session_id, user, expires_at=None):
+        """
+        Cache lookup result. `expires_at` is the naive local datetime from
+        the sessions table, None caches `user` as a negative entry.
+        """
+        now = time.time()
+        if user is None:
+            valid_until = now + self.negative_ttl
+        else:
+            valid_until = now + self.ttl
+            if expires_at is not None:
+                valid_until = min(valid_until, expires_at.timestamp())
+
+        with self._lock:
+            self._entries[session_id] = (user, valid_until)
+            self._entries.move_to_end(session_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, session_id):
+        with self._lock:
+            self._entries.pop(session_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
@@ -0,0 +1,165 @@
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+import config as conf
+
+COLUMNS = ("time", "temperature", "humidity", "lightness")
+ROUNDING = {"temperature": 2, "humidity": 1, "lightness": 0}  # as /api/history
+
+
+class RingBuffer:
+    """
+    Readings of one team in fixed size NumPy columns (see COLUMNS), time is
+    UNIX timestamp, missing values are NaN. The oldest reading is overwritten
+    when the buffer is full.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._data = np.full((len(COLUMNS), capacity), np.nan)
+        self._next = 0
+        self._size = 0
+        self.evicted_until = -np.inf  # newest time that was overwritten
+
+    def append(self, values: tuple):
+        i = self._next
+        if self._size == self.capacity:
+            self.evicted_until = max(self.evicted_until, self._data[0, i])
+        self._data[:, i] = [np.nan if v is None else v for v in values]
+        self._next = (i + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def __len__(self):
+        return self._size
+
+    def since(self, t0: float) -> np.ndarray:
+        """Columns (unsorted) of readings with time >= t0."""
+        data = self._data[:, : self._size]
+        return data[:, data[0] >= t0]
+
+
+class TimeSeriesBuffer:
+    """
+    Recent readings of all teams, fed with every new reading.
+
+    covers(since) tells whether all readings since that time are in memory:
+    the buffer knows everything after its creation (or after the warm up
+    range), minus what was overwritten in a full ring and the gaps, time
+    ranges with readings that never arrived (webserver not listening yet,
+    readings dropped on the way). A gap is closed by fill() with the
+    readings of its range from the DB.
+    Only used from the IOLoop thread.
+    """
+
+    def __init__(self, capacity=conf.TS_BUFFER_CAPACITY):
+        self.capacity = capacity
+        self._teams: dict[str, RingBuffer] = {}
+        self.covered_since = time.time()
+        self._gaps: list[tuple[float, float]] = []  # (start, end) UNIX times
+
+        self.hits = 0
+        self.misses = 0
+
+    def add(self, record: dict):
+        """Add reading, `record` as in /api/history (team, time, metrics)."""
+        ring = self._teams.get(record["team"])
+        if ring is None:
+            ring = self._teams[record["team"]] = RingBuffer(self.capacity)
+        ring.append(
+            (
+                record["time"].timestamp(),
+                record["temperature"],
+                record["humidity"],
+                record["lightness"],
+            )
+        )
+
+    def warm(self, records: list, since: datetime):
+        """Load readings since `since` (from the DB), call before serving."""
+        for record in records:
+            self.add(record)
+        self.covered_since = min(self.covered_since, since.timestamp())
+
+    def mark_gap(self, start: float, end: float):
+        """Readings with time between `start` and `end` may be missing."""
+        self._gaps.append((start, end))
+
+    def fill(self, records: list, start: float, end: float):
+        """
+        Add readings of the gap `start`..`end` (from the DB) that are not in
+        the buffer yet and close the gaps within that range. A reading is
+        already known when the team has one less than a second apart (the DB
+        may keep the time with lower precision).
+        """
+        known = {}
+        for record in records:
+            team = record["team"]
+            if team not in known:
+                ring = self._teams.get(team)
+                times = ring.since(start - 1)[0] if ring is not None else []
+                known[team] = np.sort(times)
+            t = record["time"].timestamp()
+            i = np.searchsorted(known[team], t)
+            near = known[team][max(i - 1, 0) : i + 1]
+            if not np.any(np.abs(near - t) < 1.0):
+                self.add(record)
+        self._gaps = [gap for gap in self._gaps if gap[0] < start or gap[1] > end]
+
+    def covers(self, since: datetime) -> bool:
+        t0 = since.timestamp()
+        ok = (
+            t0 >= self.covered_since
+            and all(t0 > ring.evicted_until for ring in self._teams.values())
+            and all(t0 > end for _, end in self._gaps)
+        )
+        if ok:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return ok
+
+    def records(
+        self, since: datetime, until=None, teams=None, metrics=None
+    ) -> list[dict]:
+        """
+        Readings since `since` (and before `until`) of `teams` (default all),
+        ordered by time (as /api/history). `metrics` limits the fields.
+        """
+        t0 = since.timestamp()
+        out = []
+        for team, ring in self._teams.items():
+            if teams is not None and team not in teams:
+                continue
+            data = ring.since(t0)
+            if until is not None:
+                data = data[:, data[0] < until.timestamp()]
+            columns = {"team": [team] * data.shape[1]}
+            for name, row in zip(COLUMNS, data):
+                if metrics is not None and name != "time" and name not in metrics:
+                    continue
+                if name in ROUNDING:
+                    row = np.round(row, ROUNDING[name])
+                columns[name] = [None if v != v else v for v in row.tolist()]
+            if "lightness" in columns:
+                columns["lightness"] = [
+                    None if v is None else int(v) for v in columns["lightness"]
+                ]
+            columns["time"] = [
+                datetime.fromtimestamp(t, timezone.utc) for t in columns["time"]
+            ]
+            out.extend(dict(zip(columns, row)) for row in zip(*columns.values()))
+
+        out.sort(key=lambda record: record["time"])
+        return out
+
+    def stats(self) -> dict:
+        return {
+            "teams": len(self._teams),
+            "readings": sum(len(ring) for ring in self._teams.values()),
+            "covered_s": round(time.time() - self.covered_since, 1),
+            "gaps": len(self._gaps),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
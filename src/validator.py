@@ -0,0 +1,181 @@
+import math
+import re
+from datetime import datetime
+
+import numpy as np
+import config as conf
+
+
+def _finite_float(value) -> float:
+    """float(value) of a number or numeric string, ValueError for bool, NaN, inf."""
+    if isinstance(value, bool):
+        raise ValueError(value)
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError(value)
+    return number
+
+
+class SchemaValidator:
+    """
+    Payload validator compiled from declarative schema (conf.PAYLOAD_SCHEMA).
+
+    schema: {field: (type, required, allowed values / compiled regex / None)}
+
+    Checks for every field are built once, validation of one payload is then
+    a single pass over the fields which also coerces the values.
+    """
+
+    def __init__(self, schema: dict):
+        self.schema = schema
+        self._checks = [self._compile(name, *spec) for name, spec in schema.items()]
+
+    @staticmethod
+    def _compile(name, typ, required, allowed):
+        """Return (name, required, check) where check coerces value or raises ValueError."""
+        if typ is float:
+
+            def check(value):
+                try:
+                    return _finite_float(value)
+                except (ValueError, TypeError):
+                    raise ValueError(f"Invalid {name} value: {value}") from None
+
+        elif isinstance(allowed, re.Pattern):
+            match = allowed.match
+
+            def check(value):
+                if not isinstance(value, str) or not match(value):
+                    raise ValueError(f"Invalid {name} format: {value}")
+                try:
+                    datetime.fromisoformat(value)  # e.g. month 13
+                except ValueError:
+                    raise ValueError(f"Invalid {name} date: {value}") from None
+                return value
+
+        else:
+            allowed = frozenset(allowed) if allowed is not None else None
+
+            def check(value):
+                if not isinstance(value, typ) or (
+                    allowed is not None and value not in allowed
+                ):
+                    raise ValueError(f"Invalid {name}: {value}")
+                return value
+
+        return name, required, check
+
+    def validate(self, inp) -> dict:
+        """
+        Return normalised record (all schema fields, floats coerced,
+        missing optional fields are None). Raises ValueError with the reason.
+        """
+        if not isinstance(inp, dict):
+            raise ValueError(f"Payload is not an object: {type(inp).__name__}")
+
+        record = {}
+        for name, required, check in self._checks:
+            value = inp.get(name)
+            if value is None:
+                if required:
+                    raise ValueError(f"Missing required key: {name}")
+                record[name] = None
+            else:
+                record[name] = check(value)
+        return record
+
+    def validate_batch(
+        self, payloads: list
+    ) -> tuple[dict[str, np.ndarray], np.ndarray]:
+        """
+        Validate list of payloads into NumPy columns (for replays and backfills).
+
+        Returns (columns, rejected):
+        - columns: {field: array} with valid rows only, in input order.
+          Floats are float64 (NaN for missing optional value), regex checked
+          timestamps are datetime64[us], other fields are str arrays.
+        - rejected: indices of invalid payloads, by the same rules as
+          validate() (also non-scalar values).
+        """
+        rows = [p if isinstance(p, dict) else {} for p in payloads]
+        valid = np.fromiter((isinstance(p, dict) for p in payloads), bool, len(rows))
+
+        columns = {}
+        for name, (typ, required, allowed) in self.schema.items():
+            raw = [row.get(name) for row in rows]
+            missing = np.fromiter((v is None for v in raw), bool, len(raw))
+            if typ is float:
+                col, ok = self._float_column(raw)
+            else:
+                col, ok = self._str_column(raw, typ, allowed)
+                if isinstance(allowed, re.Pattern) and required:
+                    col, ok = self._datetime_column(col, ok)
+            valid &= (ok & ~missing) if required else (ok | missing)
+            columns[name] = col
+
+        rejected = np.flatnonzero(~valid)
+        for name in self.schema:
+            columns[name] = columns[name][valid]
+        return columns, rejected
+
+    @staticmethod
+    def _float_column(raw: list) -> tuple[np.ndarray, np.ndarray]:
+        try:
+            col = np.array(raw, dtype=np.float64)  # None -> NaN
+            # lists as values would give more dimensions, bools would be 0/1
+            if col.ndim == 1 and not any(isinstance(v, bool) for v in raw):
+                # NaN and inf are rejected like in validate(), missing
+                # values are NaN too but the caller masks them
+                return col, np.isfinite(col)
+        except (ValueError, TypeError):
+            pass  # some values are not numbers, go one by one
+
+        col = np.empty(len(raw), dtype=np.float64)
+        ok = np.ones(len(raw), dtype=bool)
+        for i, value in enumerate(raw):
+            try:
+                col[i] = np.nan if value is None else _finite_float(value)
+            except (ValueError, TypeError):
+                col[i] = np.nan
+                ok[i] = False
+        return col, ok
+
+    @staticmethod
+    def _str_column(raw: list, typ, allowed) -> tuple[np.ndarray, np.ndarray]:
+        is_type = np.fromiter((isinstance(v, typ) for v in raw), bool, len(raw))
+        col = np.array([v if isinstance(v, typ) else "" for v in raw], dtype=str)
+        if isinstance(allowed, re.Pattern):
+            match = allowed.match
+            ok = np.fromiter((bool(match(v)) for v in col), bool, len(col))
+        elif allowed is not None:
+            ok = np.isin(col, list(allowed))
+        else:
+            ok = np.ones(len(col), dtype=bool)
+        return col, ok & is_type
+
+    @staticmethod
+    def _datetime_column(
+        col: np.ndarray, ok: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Parse regex checked timestamps, dates datetime.fromisoformat()
+        rejects (month 13, year 0) are not ok, same as in validate().
+        """
+        out = np.full(len(col), np.datetime64("NaT"), dtype="datetime64[us]")
+        try:
+            out[ok] = col[ok].astype("datetime64[us]")
+            ok = ok & (out >= np.datetime64("0001-01-01", "us"))
+            return out, ok
+        except ValueError:
+            pass  # some dates do not exist, go one by one
+
+        ok = ok.copy()
+        for i in np.flatnonzero(ok):
+            try:
+                out[i] = np.datetime64(datetime.fromisoformat(col[i]), "us")
+            except ValueError:
+                ok[i] = False
+        return out, ok
+
+
+VALIDATOR = SchemaValidator(conf.PAYLOAD_SCHEMA)
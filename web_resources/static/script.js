@@ -22,6 +22,7 @@ let socket;
 let sessionData = { 1: [], 2: [], 3: [], 4: [], 5: [] };
 let modalChartInstance = null;
 let currentRange = '1h';
+const HISTORY_POINTS = 500; // max points per team and metric, downsampled on the server
 
 // --- DOM ELEMENTS ---
 const liveBtn = document.getElementById('live-btn');
@@ -38,12 +39,42 @@ const timeRangeSelector = document.getElementById('time-range-selector');
 
 // --- LIVE DATA HANDLING (WEBSOCKET) ---
 
+const teamToId = { 'blue': 1, 'yellow': 2, 'green': 3, 'red': 4, 'black': 5 };
+
+// Apply one live update ({ id, team, time, data }) to the sensors and session data
+const applyUpdate = (updatedRecord) => {
+    const recordTime = new Date(updatedRecord.time);
+
+    // Update the sensor in the main array
+    sensors = sensors.map(sensor => {
+        if (sensor.id === updatedRecord.id) {
+            return {
+                ...sensor,
+                data: updatedRecord.data,
+                lastUpdate: recordTime,
+                status: 'Online' // Immediately mark as online
+            };
+        }
+        return sensor;
+    });
+
+    // Add to session data for modal graph
+    sessionData[updatedRecord.id].push({ ...updatedRecord.data, time: recordTime });
+};
+
 const startLiveUpdates = () => {
     socket = new WebSocket(`wss://aether70.zcu.cz/websocket`);
 
+    // Only the teams (and metrics) listed here are streamed, null means all
+    socket.onopen = function () {
+        socket.send(JSON.stringify({ type: 'subscribe', teams: Object.keys(teamToId), metrics: null }));
+    };
+
     socket.onmessage = function (event) {
         const message = JSON.parse(event.data);
-        const teamToId = { 'blue': 1, 'yellow': 2, 'green': 3, 'red': 4, 'black': 5 };
+        // Updates are sent in batches, at most one per team in a batch
+        const updates = message.type === 'update_batch' ? message.payload
+            : message.type === 'update' ? [message.payload] : [];
 
         if (message.type === 'initial_data') {
             const initialRecords = message.payload;
@@ -92,25 +123,8 @@ const startLiveUpdates = () => {
                 }
             });
 
-        } else if (message.type === 'update') {
-            const updatedRecord = message.payload;
-            const recordTime = new Date(updatedRecord.time);
-
-            // Update the sensor in the main array
-            sensors = sensors.map(sensor => {
-                if (sensor.id === updatedRecord.id) {
-                    return {
-                        ...sensor,
-                        data: updatedRecord.data,
-                        lastUpdate: recordTime,
-                        status: 'Online' // Immediately mark as online
-                    };
-                }
-                return sensor;
-            });
-
-            // Add to session data for modal graph
-            sessionData[updatedRecord.id].push({ ...updatedRecord.data, time: recordTime });
+        } else {
+            updates.forEach(applyUpdate);
         }
 
         console.log('Calling renderLiveView from onmessage');
@@ -118,7 +132,7 @@ const startLiveUpdates = () => {
 
         if (!sensorModal.classList.contains('hidden')) {
             const sensorId = parseInt(modalContent.dataset.sensorId, 10);
-            if (message.type === 'update' && message.payload.id === sensorId) {
+            if (updates.some(update => update.id === sensorId)) {
                 updateModalChart(sensorId);
             }
         }
@@ -571,7 +585,7 @@ const fetchHistoricalData = async (range = '1h') => {
     const teamToId = { 'blue': 1, 'yellow': 2, 'green': 3, 'red': 4, 'black': 5 };
 
     try {
-        const response = await fetch(`https://aether70.zcu.cz/api/history?range=${range}`);
+        const response = await fetch(`https://aether70.zcu.cz/api/history?range=${range}&points=${HISTORY_POINTS}`);
         if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
         const rawData = await response.json();
 